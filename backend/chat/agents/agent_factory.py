@@ -1,264 +1,225 @@
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import certifi
-import ssl
-import aiohttp
-from langchain.agents import initialize_agent, load_tools, AgentType, AgentExecutor
-from langchain.callbacks.base import BaseCallbackHandler
+import threading
+from langchain.agents import load_tools, AgentExecutor, ConversationalChatAgent
+from langchain.callbacks.manager import Callbacks
 from langchain.chat_models import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
 from backend.chat.messages.chat_message_repository import ChatMessageRepository
 from chat.models import MessageSender, ChatMessage
 from backend.project import settings
 import os
-from chat.utils import load_documents_from_csv, CSV_FILE_PATH
+from chat.agents.answer_cache import CachedAnswer
+from chat.agents.executors import run_cpu
+from chat.agents.memory import BoundedConversationMemory, summarize_messages, summary_batch
+from chat.agents.openai_async import apredict_messages
+from chat.agents.prompt_builder import AssembledPrompt
+from chat.agents.query_context import QueryContext, QueryContextCache, current_query_context
+from chat.agents.retrieval_engine import RetrievalEngine, get_retrieval_engine
 from langchain.tools import Tool
 import logging
-from konlpy.tag import Mecab
-import faiss
 import numpy as np
-from langchain.embeddings import OpenAIEmbeddings
-import re
-from fuzzywuzzy import fuzz
 
 logger = logging.getLogger(__name__)
 
-KOREA_UNIVERSITY_BUILDINGS = [
-    "아이스링크", "학군단", "수당삼양패컬티하우스", "법학관", "라이시움(평생교육원)", "중앙광장(중광)", 
-    "백주년기념관(백기)", "Science pi-Park", "문과대학", "중앙도서관(중도)", "민주광장(민광)" 
-    "프런티어관(신긱)", "한국어교육관", "중앙광장지하(중지)", "현대자동차 경영관(현차관)", "4.18기념관", 
-    "인촌기념관", "우당교양관(교양관)", "인문사회관", "산학관", "창의관", "안암학사 고시동", "민족문화관", 
-    "운초우선교육관", "기초과학관", "간호대학", "메디힐지구환경관", "타이거플라자", "로봇융합관", 
-    "안암학사 남학생동(구긱)", "체육생활관", "CJ법학관", "안암인터내셔널하우스", "안암글로벌하우스", 
-    "관리동", "교우회관", "정경관", "미디어관(미관)", "과학도서관(과도)", "우정정보관", "생명과학관(동관)", 
-     "생명과학관", "학생회관", "LG-POSCO경영관(엘포관)", "CJ 인터내셔널하우스", 
-    "아산이학관", "환경실험관", "해송법학도서관(해도/법도)", "공학관", "화정체육관", "신공학관(신공)", 
-    "사범대학", "애기능생활관", "SK미래관(에미관)", "하나스퀘어(하스)", "경영본관", 
-    "미래융합기술관", "국제관", "R&D 센터", "애기능학생회관", "파이빌 99", "본관", 
-    "CJ식품안전관", "강당", "하나과학관", "안암학사 여학생동(구긱)", "동원글로벌리더십홀(동글리)", "이학관별관",
-    "이과캠퍼스(이캠)", "문과캠퍼스(문캠)",
-]
-
 # 인증서 경로 설정
 cert_path = certifi.where()
 os.environ['REQUESTS_CA_BUNDLE'] = cert_path
 
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# MeCab 초기화
-try:
-    mecab = Mecab(dicpath=os.getenv('MECAB_PATH'))
-except Exception as e:
-    print("Failed to initialize MeCab. Dictionary path:", os.getenv('MECAB_PATH'))
-    print(str(e))
-    raise
-
-
-
-class CustomClientSession(aiohttp.ClientSession):
-    def __init__(self, *args, **kwargs):
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        kwargs['connector'] = aiohttp.TCPConnector(ssl=ssl_context)
-        super().__init__(*args, **kwargs)
-
-def extract_aliases(buildings):
-    alias_to_full_name = {}
-    for building in buildings:
-        main_name = re.split('[()]', building)[0].strip()
-        aliases = re.findall(r'\(([^)]+)\)', building)
-        for alias in aliases:
-            alias_to_full_name[alias.strip()] = main_name
-    return alias_to_full_name
-
-def replace_aliases_with_full_names(query: str, alias_to_full_name: dict) -> str:
-    for alias, full_name in alias_to_full_name.items():
-        query = re.sub(r'\b' + re.escape(alias) + r'\b', full_name, query)
-    return query
-class AgentFactory:
-
-    def __init__(self):
-        self.chat_message_repository = ChatMessageRepository()
-        logger.debug("Initializing AgentFactory")
-        self.documents = load_documents_from_csv(CSV_FILE_PATH)
-        self.tokenizer = mecab
-        self.embeddings = OpenAIEmbeddings(openai_api_key=settings.openai_api_key)
-        self.doc_embeddings, self.index = self._create_embeddings_and_index()
-        self.building_keywords = self.extract_building_keywords(KOREA_UNIVERSITY_BUILDINGS)
-        self.alias_to_full_name = extract_aliases(KOREA_UNIVERSITY_BUILDINGS)
-
-        # 시스템 메시지 설정
-        self.system_message = """
-        You are a knowledgeable assistant specializing in providing information about Korea University. 
-        You should respond in Korean and provide information about the buildings and locations within Korea University. 
-        If you receive an inquiry about a location or building that does not exist within Korea University, respond to the user by prefacing your answer with information that the location or building may not be part of Korea University. Do not simply say no.
-        If you don't know the answer to a question, simply say you don't know.
-        Do Not convey inaccurate information. Do not pass on information that you are not sure about.
-
-        List of buildings at Korea University:
-        """ + ", ".join(KOREA_UNIVERSITY_BUILDINGS)
-
-    def _create_embeddings_and_index(self):
-        logger.debug("Creating embeddings and index")
-        # 한국어 텍스트 전처리 및 임베딩 생성
-        titles = [doc['title'] for doc in self.documents]
-        tokenized_titles = [" ".join(self.tokenizer.morphs(title)) for title in titles]
-
-        logger.debug(f"Tokenized titles: {tokenized_titles}")
-
-        # OpenAI Embeddings 사용
-        doc_embeddings = self.embeddings.embed_documents(tokenized_titles)
-        
-        logger.debug(f"Document embeddings shape: {np.array(doc_embeddings).shape}")
-
-        # Faiss 인덱스 생성
-        dimension = len(doc_embeddings[0])
-        index = faiss.IndexFlatL2(dimension)
-        index.add(np.array(doc_embeddings))
-        
-        return doc_embeddings, index
-
-    def retrieve_documents(self, query: str):
-        logger.debug(f"Retrieving documents for query: {query}")
-        building = self.check_building_existence(query)
-        if building:
-            query = query.replace(query, building)  # 정식 명칭으로 대체
-        tokenized_query = " ".join(self.tokenizer.morphs(query))
-        logger.debug(f"Tokenized query: {tokenized_query}")
-        
-        query_embedding = self.embeddings.embed_query(tokenized_query)
-        logger.debug(f"Query embedding shape: {np.array(query_embedding).shape}")
-        
-        # 검색 쿼리를 통해 유사 문서 검색
-        D, I = self.index.search(np.array([query_embedding]), k=3)  # 상위 3개 검색
-        matching_documents = [self.documents[i]['content'] for i in I[0]]
-        logger.debug(f"Query: {query}, Matched {len(matching_documents)} documents, Top 3 documents: {matching_documents}")
-        return matching_documents
 
-    def extract_building_keywords(self, buildings):
-        keywords = {}
-        for building in buildings:
-            # 괄호 안의 내용 분리
-            main_name, *aliases = re.split(r'\(|\)', building)
-            main_name = main_name.strip()
-            tokens = self.tokenizer.nouns(main_name)
-            combined_tokens = self.combine_nouns(tokens)
-            main_keyword = " ".join(combined_tokens)
-            keywords[main_keyword] = main_name  # 정식 명칭 매핑
-            # 별칭도 키워드에 추가
-            for alias in aliases:
-                alias_tokens = self.tokenizer.nouns(alias)
-                combined_alias_tokens = self.combine_nouns(alias_tokens)
-                alias_keyword = " ".join(combined_alias_tokens)
-                keywords[alias_keyword] = main_name  # 정식 명칭 매핑
-        return keywords
+class AgentTemplate:
+    """
+    프로세스당 한 번만 만드는 에이전트 틀: LLM, 도구(RAGTool, llm-math), 프롬프트가 들어간 LLMChain.
+    연결마다 바뀌는 것은 메모리와 콜백뿐이므로, 연결별로는 bind() 로 AgentExecutor 만 새로 만들고
+    스트리밍 콜백은 실행할 때 callbacks 인자로 넘긴다.
+    """
 
-
-    def combine_nouns(self, tokens: List[str]) -> List[str]:
-        combined_tokens = []
-        skip_next = False
-
-        for i, token in enumerate(tokens):
-            if skip_next:
-                skip_next = False
-                continue
-            if i + 1 < len(tokens) and len(token) > 1 and len(tokens[i + 1]) > 1:
-                combined_tokens.append(token + tokens[i + 1])
-                skip_next = True
-            else:
-                combined_tokens.append(token)
-
-        return combined_tokens
-
-
-    def check_building_existence(self, query: str) -> bool:
-        logger.debug(f"Checking building existence in query: {query}")
-
-        def fuzzy_similarity(query_phrase: str, building_keyword: str) -> int:
-            return fuzz.partial_ratio(query_phrase, building_keyword)
-
-        threshold = 80  # 유사도 임계값 (0-100)
-
-        if "에미관" in query:
-            query = query.replace("에미관", "SK미래관")
-
-        query_nouns = self.tokenizer.nouns(query)
-        combined_query_nouns = self.combine_nouns(query_nouns)
-        combined_query_phrase = " ".join(combined_query_nouns)
-
-        for building in KOREA_UNIVERSITY_BUILDINGS:
-            main_name, *aliases = building.replace("(", " ").replace(")", "").split()
-            # aliases는 빈 문자열이 아닌 경우에만 포함하도록 필터링
-            building_keywords = [main_name] + [alias for alias in aliases if alias]
-
-            for building_keyword in building_keywords:
-                tokens = self.tokenizer.nouns(building_keyword)
-                combined_tokens = self.combine_nouns(tokens)
-                building_keyword_combined = " ".join(combined_tokens)
-                similarity = fuzzy_similarity(combined_query_phrase, building_keyword_combined)
-                logger.debug(f"Building: {building}, Query Phrase: {combined_query_phrase}, Building Keyword: {building_keyword_combined}, Similarity: {similarity}")
-                if similarity >= threshold:
-                    logger.debug(f"Building {building} exists in the query.")
-                    return main_name
-        logger.debug("No matching building found in the query.")
-        return None
-
-
-    async def create_agent(
-        self,
-        tool_names: List[str],
-        chat_id: str = None,
-        streaming=False,
-        callback_handlers: List[BaseCallbackHandler] = None,
-        model_name: str = "gpt-4o-mini-2024-07-18"
-    ) -> Tuple[AgentExecutor, ChatOpenAI]:
+    def __init__(self, engine: RetrievalEngine, tool_names: List[str], model_name: str):
+        self.engine = engine
         logger.debug("Creating LLM")
-        llm = ChatOpenAI(
+        self.llm = ChatOpenAI(
             temperature=0,
             openai_api_key=settings.openai_api_key,
-            streaming=streaming,
-            callbacks=callback_handlers,
+            streaming=True,
             model_name=model_name
         )
-        llm.client.session = CustomClientSession()
+        rag_tool = Tool(
+            name="RAGTool",
+            func=self._rag_tool_func,
+            coroutine=self._rag_tool_coroutine,
+            description="Retrieve documents and generate responses"
+        )
+        self.tools = [rag_tool] + load_tools(tool_names, llm=self.llm)
+        # 대화 요약은 스트리밍이 필요 없으므로 같은 모델의 별도 인스턴스를 프로세스당 하나 둔다.
+        self.summary_llm = ChatOpenAI(temperature=0, openai_api_key=settings.openai_api_key, model_name=model_name)
+        logger.debug("Initializing agent template")
+        self.agent = ConversationalChatAgent.from_llm_and_tools(llm=self.llm, tools=self.tools)
+
+    def bind(self, memory: BoundedConversationMemory) -> AgentExecutor:
+        return AgentExecutor.from_agent_and_tools(agent=self.agent, tools=self.tools, memory=memory, verbose=True)
+
+    def _rag_query(self, inputs) -> Tuple[str, Optional[QueryContext]]:
+        query = inputs.get("input", "") if isinstance(inputs, dict) else str(inputs)
+        # 현재 처리 중인 메시지의 컨텍스트가 있으면 건물 매칭 결과를 그대로 재사용한다.
+        return query, current_query_context.get()
+
+    def _rag_tool_func(self, inputs, callbacks: Callbacks = None):
+        query, context = self._rag_query(inputs)
+        building = context.canonical_building if context else self.engine.check_building_existence(query)
+        if not building:
+            return {"response": "해당 건물이나 장소는 고려대학교에 없습니다.", "retrieved_docs": []}
+        query = query.replace(query, building)
+        retrieved_docs = self.engine.retrieve_documents(query, context)
+        logger.debug(f"Retrieved documents: {retrieved_docs}")
+        prompt = self.engine.prompt_builder.build(query, retrieved_docs)
+        result = self.llm(prompt.messages, callbacks=callbacks)
+        logger.debug(f"Type of result from llm.predict: {type(result)}")
+        return {
+            "response": str(result[0].content) if isinstance(result, list) and len(result) > 0 else str(result),
+            "retrieved_docs": retrieved_docs
+        }
+
+    async def _rag_tool_coroutine(self, inputs, callbacks: Callbacks = None):
+        # 에이전트가 arun 으로 실행될 때 사용하는 비동기 버전
+        query, context = self._rag_query(inputs)
+        building = context.canonical_building if context else await run_cpu(self.engine.check_building_existence, query)
+        if not building:
+            return {"response": "해당 건물이나 장소는 고려대학교에 없습니다.", "retrieved_docs": []}
+        query = query.replace(query, building)
+        retrieved_docs = await self.engine.aretrieve_documents(query, context)
+        logger.debug(f"Retrieved documents: {retrieved_docs}")
+        prompt = self.engine.prompt_builder.build(query, retrieved_docs)
+        result = await apredict_messages(self.llm, prompt.messages, callbacks=callbacks)
+        return {
+            "response": str(result[0].content) if isinstance(result, list) and len(result) > 0 else str(result),
+            "retrieved_docs": retrieved_docs
+        }
+
+
+_agent_template: Optional[AgentTemplate] = None
+_agent_template_lock = threading.Lock()
+
+
+def get_agent_template() -> AgentTemplate:
+    global _agent_template
+    if _agent_template is None:
+        with _agent_template_lock:
+            if _agent_template is None:
+                _agent_template = AgentTemplate(get_retrieval_engine(), ["llm-math"], settings.OPENAI_CHAT_MODEL)
+    return _agent_template
 
-        def rag_tool_func(inputs):
-            query = inputs.get("input", "") if isinstance(inputs, dict) else str(inputs)
-            if not self.check_building_existence(query):
-                return {"response": "해당 건물이나 장소는 고려대학교에 없습니다.", "retrieved_docs": []}
-            query = query.replace(query, self.check_building_existence(query))
-            retrieved_docs = self.retrieve_documents(query)
-            logger.debug(f"Retrieved documents: {retrieved_docs}")
-            combined_text = self.system_message + "\n\n" + " ".join(retrieved_docs + [query])
-            from langchain.schema import HumanMessage
-            human_message = HumanMessage(content=combined_text)
-            result = llm([human_message])
-            logger.debug(f"Type of result from llm.predict: {type(result)}")
-            return {
-                "response": str(result[0].content) if isinstance(result, list) and len(result) > 0 else str(result),
-                "retrieved_docs": retrieved_docs
-            }
 
-        rag_tool = Tool(name="RAGTool", func=rag_tool_func, description="Retrieve documents and generate responses")
-        tools = [rag_tool] + load_tools(tool_names, llm=llm)
-        memory = await self._load_agent_memory(chat_id)
-        logger.debug("Initializing agent")
-        agent = initialize_agent(
-            tools=tools,
-            llm=llm,
-            agent=AgentType.CHAT_CONVERSATIONAL_REACT_DESCRIPTION,
-            verbose=True,
-            memory=memory
-        )
-        return agent, llm
+class AgentFactory:
 
-    async def _load_agent_memory(self, chat_id: str = None) -> ConversationBufferMemory:
-        memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+    def __init__(self, engine: RetrievalEngine = None):
+        self.chat_message_repository = ChatMessageRepository()
+        logger.debug("Initializing AgentFactory")
+        # 문서와 인덱스는 프로세스 공용 검색 엔진을 그대로 사용한다.
+        self.engine = engine or get_retrieval_engine()
+        self.query_contexts = QueryContextCache()
+        self.current_message_id = None
+
+    @property
+    def system_message(self) -> str:
+        return self.engine.system_message
+
+    def build_prompt(self, query: str, retrieved_docs: List[str]) -> AssembledPrompt:
+        prompt = self.engine.prompt_builder.build(query, retrieved_docs)
+        logger.debug(f"Prompt for message {self.current_message_id}: {prompt.prompt_tokens} tokens, "
+                     f"{len(prompt.passages)}/{len(retrieved_docs)} passages")
+        return prompt
+
+    def build_query_context(self, message_id: str, query: str) -> QueryContext:
+        context = self.query_contexts.get(message_id)
+        if context is None:
+            context = self.engine.build_query_context(message_id, query)
+            self.query_contexts.put(context)
+        self.current_message_id = message_id
+        current_query_context.set(context)
+        return context
+
+    async def abuild_query_context(self, message_id: str, query: str) -> QueryContext:
+        context = self.query_contexts.get(message_id)
+        if context is None:
+            context = await self.engine.abuild_query_context(message_id, query)
+            self.query_contexts.put(context)
+        self.current_message_id = message_id
+        # 에이전트의 RAG 도구는 이 태스크에서 파생되므로 같은 컨텍스트를 읽는다.
+        current_query_context.set(context)
+        return context
+
+    def retrieve_documents(self, query: str, context: QueryContext = None):
+        return self.engine.retrieve_documents(query, context)
+
+    async def aretrieve_documents(self, query: str, context: QueryContext = None, lexical_hits=None):
+        return await self.engine.aretrieve_documents(query, context, lexical_hits)
+
+    async def alexical_search(self, query: str, context: QueryContext = None):
+        return await self.engine.alexical_search(query, context)
+
+    async def alookup_answer(self, context: QueryContext, lexical_hits=None) -> Tuple[Optional[np.ndarray], Optional[CachedAnswer]]:
+        """
+        같은 건물에 대한 비슷한 질문의 답변이 캐시에 있으면 반환한다.
+        어휘 검색만으로 문서가 정해지는 질문은 질의 임베딩이 필요 없으므로 캐시 조회(임베딩 호출)를 건너뛴다.
+        """
+        if not settings.ANSWER_CACHE_ENABLED or not context.building:
+            return None, None
+        if self.engine.is_lexical_decisive(lexical_hits):
+            logger.debug(f"Skipping answer cache for message {context.message_id}: decisive lexical match")
+            return None, None
+        query_embedding = await self.engine.aembed_context(context)
+        cached = self.engine.answer_cache.lookup(context.canonical_building, query_embedding)
+        if cached is not None:
+            logger.debug(f"Answer cache hit for message {context.message_id} (similarity {cached.similarity:.3f})")
+        return query_embedding, cached
+
+    def store_answer(self, context: QueryContext, query_embedding: np.ndarray, response: str, retrieved_docs: List[str]):
+        if query_embedding is not None and context.building:
+            self.engine.answer_cache.store(context.canonical_building, query_embedding, response, retrieved_docs)
+
+    def check_building_existence(self, query: str):
+        return self.engine.check_building_existence(query)
+
+    async def create_agent(self, chat_id: str = None) -> AgentExecutor:
+        """공용 에이전트 틀에 이 연결의 대화 메모리만 묶어 AgentExecutor 를 만든다."""
+        template = get_agent_template()
+        memory = await self._load_agent_memory(chat_id, token_counter=template.llm.get_num_tokens)
+        return template.bind(memory)
+
+    async def _load_agent_memory(self, chat_id: str = None, token_counter=len) -> BoundedConversationMemory:
+        memory = BoundedConversationMemory(
+            memory_key="chat_history",
+            return_messages=True,
+            max_messages=settings.CHAT_MEMORY_MAX_MESSAGES,
+            max_tokens=settings.CHAT_MEMORY_MAX_TOKENS,
+            token_counter=token_counter,
+        )
         if chat_id:
-            chat_messages: List[ChatMessage] = await self.chat_message_repository.get_chat_messages(chat_id)
+            # 전체 기록 대신 최근 메시지와 누적 요약만 불러온다.
+            memory.summary, _ = await self.chat_message_repository.get_chat_summary(chat_id)
+            chat_messages: List[ChatMessage] = await self.chat_message_repository.get_recent_chat_messages(
+                chat_id, settings.CHAT_MEMORY_MAX_MESSAGES
+            )
             for message in chat_messages:
                 if message.sender == MessageSender.USER.value:
                     memory.chat_memory.add_user_message(message.content)
                 elif message.sender == MessageSender.AI.value:
                     memory.chat_memory.add_ai_message(message.content)
-        return memory
\ No newline at end of file
+        return memory
+
+    async def update_memory_summary(self, chat_id: str, memory: BoundedConversationMemory):
+        """
+        창 밖으로 밀려난 메시지만 기존 요약에 덧붙여 Chat 에 저장한다.
+        한 번에 CHAT_MEMORY_SUMMARY_BATCH_MESSAGES 개, CHAT_MEMORY_SUMMARY_BATCH_TOKENS 토큰까지만 반영하므로
+        요약이 없던 긴 대화는 여러 턴에 걸쳐 조금씩 요약된다.
+        """
+        if chat_id and settings.CHAT_MEMORY_SUMMARY:
+            messages = await self.chat_message_repository.get_unsummarized_messages(
+                chat_id, memory.max_messages, settings.CHAT_MEMORY_SUMMARY_BATCH_MESSAGES
+            )
+            if messages:
+                summary_llm = get_agent_template().summary_llm
+                messages = summary_batch(messages, settings.CHAT_MEMORY_SUMMARY_BATCH_TOKENS, summary_llm.get_num_tokens)
+                memory.summary = await summarize_messages(summary_llm, memory.summary, messages)
+                await self.chat_message_repository.save_chat_summary(chat_id, memory.summary, messages[-1].id)
+                logger.debug(f"Folded {len(messages)} messages into the summary of chat {chat_id}")
+        memory.trim()
@@ -0,0 +1,157 @@
+import logging
+import time
+from typing import List, NamedTuple, Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ('flat', 'ivf', 'hnsw')
+COMPRESSIONS = ('none', 'fp16', 'pq')
+
+
+class IndexSpec(NamedTuple):
+    """
+    FAISS 인덱스 종류와 압축 방식, 검색 파라미터.
+    모든 인덱스는 정규화된 벡터의 내적(= 코사인 유사도)으로 검색한다.
+    """
+    kind: str = 'flat'
+    compression: str = 'none'
+    nlist: int = 64  # IVF 클러스터 수
+    nprobe: int = 8  # IVF 검색 시 살펴볼 클러스터 수
+    hnsw_m: int = 32  # HNSW 노드당 이웃 수
+    ef_search: int = 64  # HNSW 검색 후보 수
+    pq_m: int = 64  # PQ 서브벡터 수 (차원을 나누어 떨어지게)
+
+    @property
+    def identifier(self) -> str:
+        # 검색 결과에 영향을 주는 빌드 파라미터만 넣어 산출물 키로 쓴다.
+        parts = [self.kind, self.compression]
+        if self.kind == 'ivf':
+            parts.append(f"nlist{self.nlist}")
+        if self.kind == 'hnsw':
+            parts.append(f"m{self.hnsw_m}")
+        if self.compression == 'pq':
+            parts.append(f"pq{self.pq_m}")
+        return '-'.join(parts)
+
+    @classmethod
+    def from_settings(cls, settings) -> "IndexSpec":
+        spec = cls(
+            kind=settings.RETRIEVAL_INDEX_TYPE,
+            compression=settings.RETRIEVAL_INDEX_COMPRESSION,
+            nlist=settings.RETRIEVAL_IVF_NLIST,
+            nprobe=settings.RETRIEVAL_IVF_NPROBE,
+            hnsw_m=settings.RETRIEVAL_HNSW_M,
+            ef_search=settings.RETRIEVAL_HNSW_EF_SEARCH,
+            pq_m=settings.RETRIEVAL_PQ_M,
+        )
+        if spec.kind not in INDEX_TYPES:
+            raise ValueError(f"Unknown RETRIEVAL_INDEX_TYPE {spec.kind!r}, expected one of {INDEX_TYPES}")
+        if spec.compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown RETRIEVAL_INDEX_COMPRESSION {spec.compression!r}, expected one of {COMPRESSIONS}")
+        return spec
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """행 단위로 L2 정규화한 float32 사본을 반환한다."""
+    vectors = np.array(vectors, dtype='float32', ndmin=2)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _compression(spec: IndexSpec, d: int, n: int) -> str:
+    if spec.compression != 'pq':
+        return spec.compression
+    # PQ 코드북(서브벡터당 256 중심)을 학습하기에 문서가 너무 적으면 fp16 으로 대신한다.
+    if d % spec.pq_m or n < 256:
+        logger.warning(f"PQ{spec.pq_m} needs d divisible by m and >= 256 vectors (d={d}, n={n}), using fp16")
+        return 'fp16'
+    return 'pq'
+
+
+def build_index(vectors: np.ndarray, spec: IndexSpec) -> faiss.Index:
+    """정규화된 벡터로 spec 에 맞는 인덱스를 만들고 (필요하면 학습한 뒤) 벡터를 넣는다."""
+    n, d = vectors.shape
+    metric = faiss.METRIC_INNER_PRODUCT
+    compression = _compression(spec, d, n)
+
+    if spec.kind == 'flat':
+        if compression == 'fp16':
+            index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_fp16, metric)
+        elif compression == 'pq':
+            index = faiss.IndexPQ(d, spec.pq_m, 8, metric)
+        else:
+            index = faiss.IndexFlatIP(d)
+    elif spec.kind == 'ivf':
+        # 클러스터당 학습 벡터가 충분하도록 문서 수에 맞춰 nlist 를 줄인다.
+        nlist = max(1, min(spec.nlist, n // 39))
+        quantizer = faiss.IndexFlatIP(d)
+        if compression == 'fp16':
+            index = faiss.IndexIVFScalarQuantizer(quantizer, d, nlist, faiss.ScalarQuantizer.QT_fp16, metric)
+        elif compression == 'pq':
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, spec.pq_m, 8, metric)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, metric)
+    else:
+        if compression == 'fp16':
+            index = faiss.IndexHNSWSQ(d, faiss.ScalarQuantizer.QT_fp16, spec.hnsw_m, metric)
+        elif compression == 'pq':
+            # 정규화된 벡터에서는 L2 거리 순위가 내적 순위와 같다.
+            index = faiss.IndexHNSWPQ(d, spec.pq_m, spec.hnsw_m)
+        else:
+            index = faiss.IndexHNSWFlat(d, spec.hnsw_m, metric)
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    configure_search(index, spec)
+    return index
+
+
+def configure_search(index: faiss.Index, spec: IndexSpec):
+    """디스크에서 읽은 인덱스에도 검색 파라미터(nprobe, efSearch)를 다시 적용한다."""
+    if spec.kind == 'ivf':
+        faiss.extract_index_ivf(index).nprobe = spec.nprobe
+    elif spec.kind == 'hnsw':
+        faiss.downcast_index(index).hnsw.efSearch = spec.ef_search
+
+
+class IndexEvaluation(NamedTuple):
+    spec: str
+    recall: float
+    avg_latency_ms: float
+    p95_latency_ms: float
+    bytes_per_vector: Optional[float]
+
+
+def evaluate_index(vectors: np.ndarray, queries: np.ndarray, specs: List[IndexSpec], k: int = 3) -> List[IndexEvaluation]:
+    """
+    정확한 내적 검색(flat) 결과를 기준으로 각 spec 의 recall@k 와 질의당 지연 시간을 잰다.
+    vectors, queries 는 정규화된 float32 행렬이어야 한다.
+    """
+    baseline = faiss.IndexFlatIP(vectors.shape[1])
+    baseline.add(vectors)
+    _, truth = baseline.search(queries, k)
+
+    results = []
+    for spec in specs:
+        index = build_index(vectors, spec)
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            _, found = index.search(query.reshape(1, -1), k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len(set(found[0]) & set(expected))
+        serialized = faiss.serialize_index(index)
+        results.append(IndexEvaluation(
+            spec=spec.identifier,
+            recall=hits / (len(queries) * k),
+            avg_latency_ms=float(np.mean(latencies)),
+            p95_latency_ms=float(np.percentile(latencies, 95)),
+            bytes_per_vector=len(serialized) / index.ntotal if index.ntotal else None,
+        ))
+    return results
+
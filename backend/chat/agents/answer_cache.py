@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from backend.project import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CachedAnswer(NamedTuple):
+    answer: str
+    retrieved_docs: List[str]
+    similarity: float
+
+
+class _Entry(NamedTuple):
+    building: str
+    vector: np.ndarray
+    answer: str
+    retrieved_docs: List[str]
+    expires_at: float
+
+
+class SemanticAnswerCache:
+    """
+    같은 건물에 대한 비슷한 질문의 답변을 재사용하는 캐시.
+    정식 건물 이름으로 후보를 좁힌 뒤, 정규화된 질의 임베딩의 내적(코사인 유사도)이 threshold 이상이면 적중으로 본다.
+    corpus_key(QA.csv 해시)가 바뀌면 저장된 답변을 모두 버린다.
+    """
+
+    def __init__(self, corpus_key: str, threshold: float = 0.95, max_size: int = 1000, ttl: int = 6 * 60 * 60):
+        self.corpus_key = corpus_key
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._by_building: Dict[str, List[int]] = {}
+        self._matrices: Dict[str, Tuple[List[int], np.ndarray]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype='float32')
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def invalidate(self, corpus_key: str):
+        with self._lock:
+            if corpus_key == self.corpus_key:
+                return
+            logger.info(f"Corpus changed ({self.corpus_key} -> {corpus_key}), clearing the answer cache")
+            self.corpus_key = corpus_key
+            self._entries.clear()
+            self._by_building.clear()
+            self._matrices.clear()
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        self._by_building[entry.building].remove(entry_id)
+        self._matrices.pop(entry.building, None)
+
+    def _matrix(self, building: str) -> Tuple[List[int], Optional[np.ndarray]]:
+        now = time.monotonic()
+        for entry_id in [i for i in self._by_building.get(building, []) if self._entries[i].expires_at < now]:
+            self._remove(entry_id)
+        if building not in self._matrices:
+            ids = list(self._by_building.get(building, []))
+            matrix = np.stack([self._entries[i].vector for i in ids]) if ids else None
+            self._matrices[building] = (ids, matrix)
+        return self._matrices[building]
+
+    def lookup(self, building: str, query_embedding: np.ndarray) -> Optional[CachedAnswer]:
+        vector = self._normalize(query_embedding)
+        with self._lock:
+            ids, matrix = self._matrix(building)
+            if matrix is None:
+                self.misses += 1
+                return None
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry_id = ids[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            entry = self._entries[entry_id]
+            return CachedAnswer(entry.answer, list(entry.retrieved_docs), float(similarities[best]))
+
+    def store(self, building: str, query_embedding: np.ndarray, answer: str, retrieved_docs: List[str]):
+        vector = self._normalize(query_embedding)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(building, vector, answer, list(retrieved_docs), time.monotonic() + self.ttl)
+            self._by_building.setdefault(building, []).append(entry_id)
+            self._matrices.pop(building, None)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache(corpus_key: str) -> SemanticAnswerCache:
+    """프로세스 공용 답변 캐시. 코퍼스 해시가 달라졌으면 비우고 새 키로 갱신한다."""
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache(
+                corpus_key,
+                threshold=settings.ANSWER_CACHE_THRESHOLD,
+                max_size=settings.ANSWER_CACHE_SIZE,
+                ttl=settings.ANSWER_CACHE_TTL,
+            )
+    _answer_cache.invalidate(corpus_key)
+    return _answer_cache
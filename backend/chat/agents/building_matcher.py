@@ -0,0 +1,137 @@
+import logging
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+from rapidfuzz import fuzz, process
+
+logger = logging.getLogger(__name__)
+
+# 앞 글자가 한글/영문/숫자가 아니면 어절의 시작이다.
+_WORD_START = r'(?<![0-9A-Za-z\uac00-\ud7a3])'
+# 명사 뒤에 붙어 동사/형용사를 만드는 접미사 ("중지하다", "과도하게", "중지되다")
+_NOT_VERB_SUFFIX = r'(?!하|되|시키)'
+# 별칭과 비교할 때 이어 붙여 보는 최대 명사 개수 ("현차" + "관")
+_MAX_NOUN_SPAN = 3
+
+
+class BuildingMatch(NamedTuple):
+    canonical_name: str  # 정식 명칭 (괄호 앞 이름)
+    matched_text: str  # 질의에서 일치한 표기 또는 키워드
+    alias_hit: bool  # 별칭으로 일치했는지 여부
+    score: float  # 0-100, 정확히 일치하면 100
+
+
+def combine_nouns(tokens: List[str]) -> List[str]:
+    combined_tokens = []
+    skip_next = False
+
+    for i, token in enumerate(tokens):
+        if skip_next:
+            skip_next = False
+            continue
+        if i + 1 < len(tokens) and len(token) > 1 and len(tokens[i + 1]) > 1:
+            combined_tokens.append(token + tokens[i + 1])
+            skip_next = True
+        else:
+            combined_tokens.append(token)
+
+    return combined_tokens
+
+
+def _strip_spaces(text: str) -> str:
+    return re.sub(r'\s+', '', text)
+
+
+class BuildingMatcher:
+    """
+    시작 시 한 번 컴파일되는 건물 이름 매처.
+    정식 명칭을 하나의 정규식 오토마톤으로 묶어 먼저 찾고, 다음으로 별칭을 형태소 경계에서만 찾는다.
+    둘 다 없을 때만 미리 토큰화해 둔 키워드 집합에 대해 퍼지 매칭을 한 번에 수행한다.
+    """
+
+    def __init__(self, buildings: List[str], tokenizer, threshold: int = 80):
+        self.tokenizer = tokenizer
+        self.threshold = threshold  # 유사도 임계값 (0-100)
+        self.surface_forms: Dict[str, BuildingMatch] = {}
+        self.keywords: Dict[str, str] = {}
+
+        for building in buildings:
+            # 괄호 안의 내용은 별칭 ("해도/법도" 처럼 여러 개일 수 있음)
+            main_name = re.split('[()]', building)[0].strip()
+            aliases = [
+                alias.strip()
+                for group in re.findall(r'\(([^)]+)\)', building)
+                for alias in group.split('/')
+                if alias.strip()
+            ]
+            self._add_surface_form(main_name, main_name, alias_hit=False)
+            for alias in aliases:
+                self._add_surface_form(alias, main_name, alias_hit=True)
+            for name in [main_name] + aliases:
+                keyword = " ".join(combine_nouns(self.tokenizer.nouns(name)))
+                if keyword:
+                    self.keywords.setdefault(keyword, main_name)
+
+        # 같은 위치에서는 긴 표기가 먼저 일치하도록 길이 역순으로 정렬한다 ("경영본관" > "본관").
+        names = sorted((key for key, match in self.surface_forms.items() if not match.alias_hit), key=len, reverse=True)
+        self._automaton = re.compile("|".join(re.escape(name) for name in names))
+        # "해도", "중지" 같은 짧은 별칭은 다른 단어 안에도 흔히 들어 있으므로 ("공부해도", "중지하다")
+        # 어절의 시작에서, 뒤에 '하/되' 가 붙어 동사가 되지 않는 경우만 후보로 본다.
+        aliases = sorted((key for key, match in self.surface_forms.items() if match.alias_hit), key=len, reverse=True)
+        self._alias_automaton = re.compile(
+            _WORD_START + "(" + "|".join(re.escape(alias) for alias in aliases) + ")" + _NOT_VERB_SUFFIX
+        )
+        self._keyword_choices = list(self.keywords)
+
+    def _add_surface_form(self, text: str, canonical_name: str, alias_hit: bool):
+        key = _strip_spaces(text)
+        if key and key not in self.surface_forms:
+            self.surface_forms[key] = BuildingMatch(canonical_name, text, alias_hit, 100.0)
+
+    @property
+    def alias_to_full_name(self) -> Dict[str, str]:
+        return {match.matched_text: match.canonical_name for match in self.surface_forms.values() if match.alias_hit}
+
+    def match_exact(self, query: str, query_nouns: List[str] = None) -> Optional[BuildingMatch]:
+        found = self._automaton.findall(_strip_spaces(query))
+        if found:
+            return self.surface_forms[max(found, key=len)]
+        return self.match_alias(query, query_nouns)
+
+    def match_alias(self, query: str, query_nouns: List[str] = None) -> Optional[BuildingMatch]:
+        """별칭 후보 중 질의의 명사(또는 연속한 명사를 이어 붙인 것)와 정확히 같은 것만 일치로 본다."""
+        candidates = self._alias_automaton.findall(query)
+        if not candidates:
+            return None
+        if query_nouns is None:
+            query_nouns = self.tokenizer.nouns(query)
+        spans = {
+            "".join(query_nouns[start:end])
+            for start in range(len(query_nouns))
+            for end in range(start + 1, min(start + _MAX_NOUN_SPAN, len(query_nouns)) + 1)
+        }
+        found = [alias for alias in candidates if alias in spans]
+        if not found:
+            return None
+        return self.surface_forms[max(found, key=len)]
+
+    def match_fuzzy(self, query_nouns: List[str]) -> Optional[BuildingMatch]:
+        query_phrase = " ".join(combine_nouns(query_nouns))
+        if not query_phrase or not self._keyword_choices:
+            return None
+        best = process.extractOne(
+            query_phrase, self._keyword_choices, scorer=fuzz.partial_ratio, score_cutoff=self.threshold
+        )
+        if best is None:
+            return None
+        keyword, score, _ = best
+        return BuildingMatch(self.keywords[keyword], keyword, False, float(score))
+
+    def match(self, query: str, query_nouns: List[str] = None) -> Optional[BuildingMatch]:
+        match = self.match_exact(query, query_nouns)
+        if match is None:
+            if query_nouns is None:
+                query_nouns = self.tokenizer.nouns(query)
+            match = self.match_fuzzy(query_nouns)
+        logger.debug(f"Building match for query {query!r}: {match}")
+        return match
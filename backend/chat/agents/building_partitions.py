@@ -0,0 +1,86 @@
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from chat.agents.ann_index import IndexSpec, build_index, normalize
+
+logger = logging.getLogger(__name__)
+
+
+class BuildingPartitions:
+    """
+    건물별로 나눈 작은 FAISS 인덱스들.
+    문서마다 붙은 건물 태그로 행을 나누고, 각 파티션의 검색 결과를 전체 문서 번호로 되돌려 준다.
+    건물이 정해진 질문은 그 건물의 문서와 건물 태그가 없는 공통 문서만 검색하므로
+    다른 건물 문서는 프롬프트에 끼어들지 않고, 태그가 없는 문서도 계속 검색된다.
+    파티션도 전체 인덱스와 같은 IndexSpec 의 압축 방식으로 만들어, 대부분의 검색이 설정된 인덱스를 거치게 한다.
+    """
+
+    # 이보다 작은 파티션은 IVF/HNSW 대신 같은 압축의 flat 인덱스를 쓴다 (근사 인덱스 학습에 문서가 부족하다).
+    MIN_ANN_SIZE = 1000
+
+    def __init__(self, doc_embeddings: np.ndarray, buildings: Sequence[Optional[str]], index_spec: IndexSpec = IndexSpec()):
+        rows: Dict[str, List[int]] = {}
+        untagged: List[int] = []
+        for doc_id, building in enumerate(buildings):
+            if building:
+                rows.setdefault(building, []).append(doc_id)
+            else:
+                untagged.append(doc_id)
+        self._partitions: Dict[str, tuple] = {}
+        for building, ids in rows.items():
+            # 태그가 없는 문서는 모든 파티션에 함께 넣는다.
+            ids = sorted(ids + untagged)
+            index = build_index(normalize(doc_embeddings[ids]), self._partition_spec(index_spec, len(ids)))
+            self._partitions[building] = (np.asarray(ids, dtype='int64'), index)
+        self.untagged = len(untagged)
+        self._lock = threading.Lock()
+        self.partition_searches = 0
+        self.global_fallbacks = 0
+        logger.debug(f"Built {len(self._partitions)} building partitions ({index_spec.identifier}), "
+                     f"{self.untagged} untagged documents")
+
+    @classmethod
+    def _partition_spec(cls, spec: IndexSpec, size: int) -> IndexSpec:
+        if size < cls.MIN_ANN_SIZE:
+            spec = spec._replace(kind='flat')
+        if spec.compression == 'pq' and size < 256:
+            # PQ 코드북을 학습할 수 없는 작은 파티션은 경고 없이 fp16 으로 저장한다.
+            spec = spec._replace(compression='fp16')
+        return spec
+
+    def __contains__(self, building: str) -> bool:
+        return building in self._partitions
+
+    def doc_ids(self, building: Optional[str]) -> Optional[np.ndarray]:
+        """건물 파티션(태그 없는 문서 포함)의 전체 문서 번호. 파티션이 없으면 None"""
+        partition = self._partitions.get(building) if building else None
+        return partition[0] if partition else None
+
+    def search(self, building: Optional[str], query_embedding: np.ndarray, k: int) -> Optional[List[int]]:
+        """
+        정규화된 질의 벡터로 건물 파티션에서 문서 번호를 찾는다.
+        파티션이 없으면 None 을 반환해 전체 인덱스를 쓰게 한다.
+        """
+        partition = self._partitions.get(building) if building else None
+        with self._lock:
+            if partition is None:
+                self.global_fallbacks += 1
+            else:
+                self.partition_searches += 1
+        if partition is None:
+            return None
+        ids, index = partition
+        _, positions = index.search(query_embedding.reshape(1, -1), k=min(k, index.ntotal))
+        return [int(ids[p]) for p in positions[0] if p >= 0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'partitions': len(self._partitions),
+                'untagged_documents': self.untagged,
+                'partition_searches': self.partition_searches,
+                'global_fallbacks': self.global_fallbacks,
+            }
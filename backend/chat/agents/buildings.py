@@ -0,0 +1,17 @@
+# 고려대학교 건물 목록 (괄호 안은 별칭)
+KOREA_UNIVERSITY_BUILDINGS = [
+    "아이스링크", "학군단", "수당삼양패컬티하우스", "법학관", "라이시움(평생교육원)", "중앙광장(중광)", 
+    "백주년기념관(백기)", "Science pi-Park", "문과대학", "중앙도서관(중도)", "민주광장(민광)", 
+    "프런티어관(신긱)", "한국어교육관", "중앙광장지하(중지)", "현대자동차 경영관(현차관)", "4.18기념관", 
+    "인촌기념관", "우당교양관(교양관)", "인문사회관", "산학관", "창의관", "안암학사 고시동", "민족문화관", 
+    "운초우선교육관", "기초과학관", "간호대학", "메디힐지구환경관", "타이거플라자", "로봇융합관", 
+    "안암학사 남학생동(구긱)", "체육생활관", "CJ법학관", "안암인터내셔널하우스", "안암글로벌하우스", 
+    "관리동", "교우회관", "정경관", "미디어관(미관)", "과학도서관(과도)", "우정정보관", "생명과학관(동관)", 
+     "생명과학관", "학생회관", "LG-POSCO경영관(엘포관)", "CJ 인터내셔널하우스", 
+    "아산이학관", "환경실험관", "해송법학도서관(해도/법도)", "공학관", "화정체육관", "신공학관(신공)", 
+    "사범대학", "애기능생활관", "SK미래관(에미관)", "하나스퀘어(하스)", "경영본관", 
+    "미래융합기술관", "국제관", "R&D 센터", "애기능학생회관", "파이빌 99", "본관", 
+    "CJ식품안전관", "강당", "하나과학관", "안암학사 여학생동(구긱)", "동원글로벌리더십홀(동글리)", "이학관별관",
+    "이과캠퍼스(이캠)", "문과캠퍼스(문캠)",
+]
+
@@ -1,4 +1,6 @@
+import asyncio
 import json
+import time
 from typing import Optional, Any, Dict, List
 from uuid import UUID
 
@@ -6,11 +8,100 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from langchain.callbacks.base import AsyncCallbackHandler
 from langchain.schema import LLMResult, BaseMessage
 
+from backend.project import settings
+from chat.agents.response_formatter import IncrementalResponseFormatter
+
 
 class AsyncStreamingCallbackHandler(AsyncCallbackHandler):
+    """
+    LLM 토큰을 웹소켓으로 전달하는 콜백.
+    flush_interval 이 0 보다 크면 토큰을 모아 시간/바이트 기준으로 한 프레임씩 보내고,
+    전송 큐가 가득 차면 토큰 수신을 기다리게 해 느린 클라이언트 때문에 메모리가 늘어나지 않도록 한다.
+    """
+
+    message_type = 'debug'
 
-    def __init__(self, consumer: AsyncWebsocketConsumer):
+    def __init__(
+        self,
+        consumer: AsyncWebsocketConsumer,
+        flush_interval: float = None,
+        flush_bytes: int = None,
+        max_queue_size: int = None,
+    ):
         self.consumer = consumer
+        self.flush_interval = settings.STREAMING_FLUSH_INTERVAL_MS / 1000 if flush_interval is None else flush_interval
+        self.flush_bytes = settings.STREAMING_FLUSH_BYTES if flush_bytes is None else flush_bytes
+        self.max_queue_size = settings.STREAMING_SEND_QUEUE_SIZE if max_queue_size is None else max_queue_size
+        self._buffer: List[str] = []
+        self._buffer_bytes = 0
+        self._last_flush = time.monotonic()
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._sender: Optional[asyncio.Task] = None
+        self.frames_sent = 0
+        self.max_queue_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _ensure_sender(self):
+        # 큐와 전송 태스크는 이벤트 루프 안에서 처음 필요할 때 만든다.
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._flush_lock = asyncio.Lock()
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.ensure_future(self._send_loop())
+
+    async def _send_loop(self):
+        while True:
+            text_data = await self._queue.get()
+            try:
+                await self.consumer.send(text_data=text_data)
+                self.frames_sent += 1
+            finally:
+                self._queue.task_done()
+
+    async def _enqueue(self, message: str):
+        self._ensure_sender()
+        # 큐가 가득 차 있으면 여기서 기다리므로 느린 클라이언트가 LLM 스트림에 배압을 건다.
+        await self._queue.put(json.dumps({'message': message, 'type': self.message_type}))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+    async def flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._buffer:
+            return
+        self._ensure_sender()
+        # 타이머 flush 와 토큰 flush 가 겹쳐도 프레임 순서가 바뀌지 않도록 잠근다.
+        async with self._flush_lock:
+            message = "".join(self._buffer)
+            self._buffer = []
+            self._buffer_bytes = 0
+            self._last_flush = time.monotonic()
+            if message:
+                await self._enqueue(message)
+
+    def _on_flush_timer(self):
+        self._flush_timer = None
+        asyncio.ensure_future(self.flush())
+
+    async def drain(self):
+        # 지금까지 쌓인 프레임이 모두 전송될 때까지 기다린다.
+        await self.flush()
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._sender is not None:
+            self._sender.cancel()
+            self._sender = None
 
     async def on_llm_new_token(
         self,
@@ -21,7 +112,16 @@ class AsyncStreamingCallbackHandler(AsyncCallbackHandler):
         **kwargs: Any,
     ) -> None:
         # Send the token to any consumers (e.g. frontend client)
-        await self.consumer.send(text_data=json.dumps({'message': token, 'type': 'debug'}))
+        if self.flush_interval <= 0:
+            await self._enqueue(token)
+            return
+
+        self._buffer.append(token)
+        self._buffer_bytes += len(token.encode('utf-8'))
+        if self._buffer_bytes >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval:
+            await self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(self.flush_interval, self._on_flush_timer)
 
     async def on_llm_end(
         self,
@@ -32,7 +132,8 @@ class AsyncStreamingCallbackHandler(AsyncCallbackHandler):
         **kwargs: Any,
     ) -> None:
         # When the LLM ends, add a new line so that debug messages are spaced with new lines.
-        await self.consumer.send(text_data=json.dumps({'message': '\n\n', 'type': 'debug'}))
+        self._buffer.append('\n\n')
+        await self.drain()
 
     async def on_chat_model_start(
         self, serialized: Dict[str, Any],
@@ -44,3 +145,27 @@ class AsyncStreamingCallbackHandler(AsyncCallbackHandler):
     ) -> Any:
         # Do nothing
         pass
+
+
+class AnswerStreamingCallbackHandler(AsyncStreamingCallbackHandler):
+    """
+    최종 RAG 답변 생성에만 붙이는 콜백.
+    토큰을 format_response 와 같은 규칙으로 정리해 'answer_delta' 프레임으로 보낸다.
+    """
+
+    message_type = 'answer_delta'
+
+    def __init__(self, consumer: AsyncWebsocketConsumer, **kwargs: Any):
+        super().__init__(consumer, **kwargs)
+        self.formatter = IncrementalResponseFormatter()
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        text = self.formatter.feed(token)
+        if text:
+            await super().on_llm_new_token(text, **kwargs)
+
+    async def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        rest = self.formatter.finish()
+        if rest:
+            self._buffer.append(rest)
+        await self.drain()
@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from chat.agents.embedding_providers import EmbeddingProvider
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRateLimiter:
+    """
+    분당 토큰 수(TPM) 한도를 지키는 토큰 버킷.
+    tokens_per_minute 가 0 이면 제한하지 않는다.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self._available = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int):
+        if self.tokens_per_minute <= 0:
+            return
+        # 한 번에 한도보다 큰 요청은 한도만큼만 기다린다.
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._available = min(
+                    self.tokens_per_minute,
+                    self._available + (now - self._updated) * self.tokens_per_minute / 60,
+                )
+                self._updated = now
+                if self._available >= tokens:
+                    self._available -= tokens
+                    return
+                await asyncio.sleep((tokens - self._available) * 60 / self.tokens_per_minute)
+
+
+class CorpusEmbedder:
+    """
+    코퍼스 전체를 배치로 나눠 임베딩하는 파이프라인.
+    배치 여러 개를 동시에 요청하되 분당 토큰 한도를 지키고, 실패한 배치는 지수 백오프로 재시도한다.
+    결과는 미리 할당한 float32 행렬(.npy 메모리 매핑)에 바로 쓰고, 끝난 배치를 체크포인트에 기록하므로
+    중간에 멈춘 빌드는 다음 실행에서 남은 배치만 이어서 임베딩한다.
+    """
+
+    MATRIX_FILE = 'partial.npy'
+    PROGRESS_FILE = 'progress.json'
+
+    def __init__(self, provider: EmbeddingProvider, batch_size: int = 256, max_concurrency: int = 4,
+                 tokens_per_minute: int = 0, max_retries: int = 5, count_tokens: Callable[[str], int] = None):
+        self.provider = provider
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.count_tokens = count_tokens or provider.count_tokens
+
+    @staticmethod
+    def _fingerprint(texts: Sequence[str]) -> str:
+        digest = hashlib.sha256()
+        for text in texts:
+            digest.update(text.encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    def _load_progress(self, checkpoint_dir: str, fingerprint: str) -> Optional[dict]:
+        path = os.path.join(checkpoint_dir, self.PROGRESS_FILE)
+        try:
+            with open(path, encoding='utf-8') as file:
+                progress = json.load(file)
+        except (OSError, ValueError):
+            return None
+        # 끝난 배치는 번호로 기록하므로 배치 크기가 바뀌면 번호가 가리키는 행도 달라진다.
+        if (progress.get('fingerprint') != fingerprint or progress.get('model') != self.provider.model
+                or progress.get('batch_size') != self.batch_size):
+            return None
+        return progress
+
+    def _save_progress(self, checkpoint_dir: str, progress: dict):
+        path = os.path.join(checkpoint_dir, self.PROGRESS_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(progress, file)
+        os.replace(tmp_path, path)
+
+    async def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return np.asarray(await self.provider.aembed_documents(texts), dtype='float32')
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(60, 2 ** attempt)
+                logger.warning(f"Embedding batch of {len(texts)} failed ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def aembed(self, texts: Sequence[str], checkpoint_dir: str) -> np.ndarray:
+        texts = list(texts)
+        batches = [(start, texts[start:start + self.batch_size]) for start in range(0, len(texts), self.batch_size)]
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        matrix_path = os.path.join(checkpoint_dir, self.MATRIX_FILE)
+        fingerprint = self._fingerprint(texts)
+
+        progress = self._load_progress(checkpoint_dir, fingerprint)
+        if progress is not None and os.path.exists(matrix_path):
+            matrix = np.load(matrix_path, mmap_mode='r+')
+            logger.info(f"Resuming corpus embedding: {len(progress['done'])} of {len(batches)} batches already done")
+        else:
+            # 차원을 알기 위해 첫 배치를 먼저 임베딩한 뒤 전체 행렬을 할당한다.
+            first = await self._embed_batch(batches[0][1])
+            matrix = np.lib.format.open_memmap(matrix_path, mode='w+', dtype='float32', shape=(len(texts), first.shape[1]))
+            matrix[:len(first)] = first
+            progress = {'fingerprint': fingerprint, 'model': self.provider.model, 'batch_size': self.batch_size, 'done': [0]}
+            matrix.flush()
+            self._save_progress(checkpoint_dir, progress)
+
+        done = set(progress['done'])
+        limiter = TokenRateLimiter(self.tokens_per_minute)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(batch_number: int, start: int, batch: List[str]):
+            async with semaphore:
+                await limiter.acquire(sum(self.count_tokens(text) for text in batch))
+                vectors = await self._embed_batch(batch)
+            matrix[start:start + len(batch)] = vectors
+            matrix.flush()
+            done.add(batch_number)
+            progress['done'] = sorted(done)
+            self._save_progress(checkpoint_dir, progress)
+
+        await asyncio.gather(*[
+            run(number, start, batch) for number, (start, batch) in enumerate(batches) if number not in done
+        ])
+        logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches")
+        return np.array(matrix, dtype='float32')
+
+    def embed(self, texts: Sequence[str], checkpoint_dir: str) -> np.ndarray:
+        """동기 코드(엔진 빌드, 관리 명령)에서 호출한다. 실행 중인 이벤트 루프와 섞이지 않도록 별도 스레드에서 돌린다."""
+        if not texts:
+            return np.empty((0, 0), dtype='float32')
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='corpus-embed') as executor:
+            return executor.submit(asyncio.run, self.aembed(texts, checkpoint_dir)).result()
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+
+import numpy as np
+import redis
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingCache:
+    """
+    Mecab 으로 정규화한 질의와 모델 이름을 키로 질의 임베딩을 캐시한다.
+    프로세스 내부 LRU 캐시를 먼저 보고, 설정되어 있으면 워커 간에 공유되는 Redis 캐시를 본다.
+    """
+
+    def __init__(
+        self,
+        embed_query: Callable[[str], List[float]],
+        model_name: str,
+        aembed_query: Callable[[str], Awaitable[List[float]]] = None,
+        max_size: int = 1024,
+        ttl: int = 3600,
+        redis_url: Optional[str] = None,
+    ):
+        self.embed_query = embed_query
+        self.aembed_query = aembed_query
+        self.model_name = model_name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = redis.Redis.from_url(redis_url) if redis_url else None
+        self._aredis = aioredis.Redis.from_url(redis_url) if redis_url else None
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _key(self, normalized_query: str) -> str:
+        digest = hashlib.sha1(f"{self.model_name}\x00{normalized_query}".encode('utf-8')).hexdigest()
+        return f"query_embedding:{digest}"
+
+    def _get_local(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, vector = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def _count_redis_hit(self):
+        with self._lock:
+            self.redis_hits += 1
+
+    def _count_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def _put_local(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _get_redis(self, key: str) -> Optional[np.ndarray]:
+        if self._redis is None:
+            return None
+        try:
+            raw = self._redis.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Query embedding cache read from Redis failed: {e}")
+            return None
+        return np.frombuffer(raw, dtype='float32') if raw else None
+
+    def _put_redis(self, key: str, vector: np.ndarray):
+        if self._redis is None:
+            return
+        try:
+            self._redis.setex(key, self.ttl, vector.tobytes())
+        except redis.RedisError as e:
+            logger.warning(f"Query embedding cache write to Redis failed: {e}")
+
+    def get_or_embed(self, normalized_query: str) -> np.ndarray:
+        key = self._key(normalized_query)
+        vector = self._get_local(key)
+        if vector is not None:
+            return vector
+
+        vector = self._get_redis(key)
+        if vector is not None:
+            self._count_redis_hit()
+            self._put_local(key, vector)
+            return vector
+
+        self._count_miss()
+        vector = np.asarray(self.embed_query(normalized_query), dtype='float32')
+        self._put_local(key, vector)
+        self._put_redis(key, vector)
+        return vector
+
+    async def _aget_redis(self, key: str) -> Optional[np.ndarray]:
+        if self._aredis is None:
+            return None
+        try:
+            raw = await self._aredis.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Query embedding cache read from Redis failed: {e}")
+            return None
+        return np.frombuffer(raw, dtype='float32') if raw else None
+
+    async def _aput_redis(self, key: str, vector: np.ndarray):
+        if self._aredis is None:
+            return
+        try:
+            await self._aredis.setex(key, self.ttl, vector.tobytes())
+        except redis.RedisError as e:
+            logger.warning(f"Query embedding cache write to Redis failed: {e}")
+
+    async def aget_or_embed(self, normalized_query: str) -> np.ndarray:
+        # get_or_embed 의 비동기 버전. 임베딩 API 호출 동안 스레드를 점유하지 않는다.
+        key = self._key(normalized_query)
+        vector = self._get_local(key)
+        if vector is not None:
+            return vector
+
+        vector = await self._aget_redis(key)
+        if vector is not None:
+            self._count_redis_hit()
+            self._put_local(key, vector)
+            return vector
+
+        self._count_miss()
+        vector = np.asarray(await self.aembed_query(normalized_query), dtype='float32')
+        self._put_local(key, vector)
+        await self._aput_redis(key, vector)
+        return vector
+
+    def stats(self) -> dict:
+        # 카운터는 CPU 전용 풀 스레드에서도 바뀌므로 LRU 와 같은 락 안에서 읽는다.
+        with self._lock:
+            size, hits, redis_hits, misses = len(self._entries), self.hits, self.redis_hits, self.misses
+        lookups = hits + redis_hits + misses
+        return {
+            'size': size,
+            'hits': hits,
+            'redis_hits': redis_hits,
+            'misses': misses,
+            'hit_ratio': (hits + redis_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,135 @@
+import hashlib
+from typing import List, Sequence
+
+import numpy as np
+import tiktoken
+from langchain.embeddings import OpenAIEmbeddings
+
+from backend.project import settings
+from chat.agents.openai_async import aembed_documents, aembed_query
+
+
+class EmbeddingProvider:
+    """
+    문서/질의 임베딩을 만드는 공통 인터페이스.
+    name 과 model 은 인덱스 산출물(meta.json)과 캐시 키에 기록되어, 다른 제공자의 벡터가 섞이지 않게 한다.
+    """
+
+    name: str = ''
+    model: str = ''
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        # 로컬 제공자는 계산이 짧으므로 그대로 실행한다.
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        return self.embed_query(text)
+
+    def count_tokens(self, text: str) -> int:
+        """요청 속도 제한에 쓰는 대략적인 토큰 수"""
+        return len(text.split())
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI Embeddings API (네트워크 호출)"""
+
+    name = 'openai'
+
+    def __init__(self, api_key: str):
+        self.embeddings = OpenAIEmbeddings(openai_api_key=api_key)
+        self.model = self.embeddings.model
+        self.encoding = tiktoken.get_encoding("cl100k_base")
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        return np.asarray(self.embeddings.embed_documents(list(texts)), dtype='float32')
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return np.asarray(self.embeddings.embed_query(text), dtype='float32')
+
+    async def aembed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        return np.asarray(await aembed_documents(self.embeddings, list(texts)), dtype='float32')
+
+    async def aembed_query(self, text: str) -> np.ndarray:
+        return np.asarray(await aembed_query(self.embeddings, text), dtype='float32')
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    네트워크 없이 CPU 에서 계산하는 해싱 TF 임베딩.
+    공백으로 나뉜 형태소와 각 형태소의 글자 n-gram 을 부호 있는 해시로 dimension 차원에 모으고,
+    로그 TF 를 적용해 L2 정규화한다. 배치 전체를 한 번의 np.add.at 으로 채운다.
+    """
+
+    name = 'hashing'
+
+    def __init__(self, dimension: int = 1024, ngram_range=(2, 3)):
+        self.dimension = dimension
+        self.ngram_range = ngram_range
+        self.model = f"hashing-{dimension}-ngram{ngram_range[0]}{ngram_range[1]}"
+
+    def _features(self, text: str) -> List[str]:
+        features = []
+        for token in text.split():
+            features.append(token)
+            padded = f"<{token}>"
+            for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    @staticmethod
+    def _hash(feature: str) -> int:
+        # 프로세스마다 달라지는 hash() 대신 고정된 해시를 쓴다.
+        return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        rows, columns, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                hashed = self._hash(feature)
+                rows.append(row)
+                columns.append(hashed % self.dimension)
+                signs.append(1.0 if (hashed >> 63) & 1 else -1.0)
+        counts = np.zeros((len(texts), self.dimension), dtype='float32')
+        np.add.at(counts, (np.asarray(rows, dtype='int64'), np.asarray(columns, dtype='int64')),
+                  np.asarray(signs, dtype='float32'))
+        vectors = np.sign(counts) * np.log1p(np.abs(counts))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+class FakeEmbeddingProvider(EmbeddingProvider):
+    """테스트와 벤치마크용: 같은 텍스트에 항상 같은 단위 벡터를 돌려주는 결정적 임베딩"""
+
+    name = 'fake'
+
+    def __init__(self, dimension: int = 64):
+        self.dimension = dimension
+        self.model = f"fake-{dimension}"
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.empty((len(texts), self.dimension), dtype='float32')
+        for row, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+            vectors[row] = np.random.default_rng(seed).standard_normal(self.dimension)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def create_embedding_provider(name: str = None) -> EmbeddingProvider:
+    """EMBEDDING_PROVIDER 설정(openai/hashing/fake)에 맞는 임베딩 제공자를 만든다."""
+    name = name or settings.EMBEDDING_PROVIDER
+    if name == 'openai':
+        return OpenAIEmbeddingProvider(settings.openai_api_key)
+    if name == 'hashing':
+        return HashingEmbeddingProvider(settings.EMBEDDING_DIMENSION)
+    if name == 'fake':
+        return FakeEmbeddingProvider(settings.EMBEDDING_DIMENSION)
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER {name!r}, expected one of ('openai', 'hashing', 'fake')")
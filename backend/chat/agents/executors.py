@@ -0,0 +1,32 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from backend.project import settings
+
+_cpu_executor: Optional[ThreadPoolExecutor] = None
+_cpu_executor_lock = threading.Lock()
+
+
+def get_cpu_executor() -> ThreadPoolExecutor:
+    """
+    Mecab, FAISS 처럼 CPU 를 쓰는 작업 전용 스레드 풀.
+    OpenAI 호출은 이벤트 루프에서 비동기로 처리하므로 여기서 스레드를 점유하지 않는다.
+    """
+    global _cpu_executor
+    if _cpu_executor is None:
+        with _cpu_executor_lock:
+            if _cpu_executor is None:
+                _cpu_executor = ThreadPoolExecutor(
+                    max_workers=settings.CPU_EXECUTOR_WORKERS,
+                    thread_name_prefix='chat-cpu',
+                )
+    return _cpu_executor
+
+
+async def run_cpu(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_cpu_executor(), functools.partial(func, *args, **kwargs))
+
@@ -0,0 +1,130 @@
+import asyncio
+import atexit
+import logging
+import ssl
+import threading
+from typing import Optional
+
+import aiohttp
+import certifi
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+
+from backend.project import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAIHttpPool:
+    """
+    워커 프로세스 하나가 OpenAI 채팅/임베딩 호출에 함께 쓰는 HTTP 연결 풀.
+    비동기 호출은 aiohttp 세션 하나(openai.aiosession), 동기 호출은 requests 세션 하나(openai.requestssession)를 공유하므로
+    웹소켓 연결마다 TLS 핸드셰이크를 새로 하거나 세션을 흘리지 않는다.
+    aiohttp 세션은 그것을 쓰는 마지막 웹소켓 연결이 끊길 때 닫고, 다음 연결이 오면 다시 만든다.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 20, keepalive_timeout: float = 30,
+                 dns_cache_ttl: int = 300):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.ssl_context = ssl.create_default_context(cafile=certifi.where())
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock: Optional[asyncio.Lock] = None
+        self.consumers = 0
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+
+        self.sync_session = requests.Session()
+        self.sync_session.verify = certifi.where()
+        self.sync_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=limit_per_host, max_retries=2))
+        openai.requestssession = self.sync_session
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            self.requests += 1
+
+        async def on_connection_create_end(session, context, params):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self.connections_reused += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    async def session(self) -> aiohttp.ClientSession:
+        # aiohttp 세션은 이벤트 루프 안에서 처음 필요할 때 만든다.
+        if self._session_lock is None:
+            self._session_lock = asyncio.Lock()
+        async with self._session_lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(
+                    ssl=self.ssl_context,
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    keepalive_timeout=self.keepalive_timeout,
+                    use_dns_cache=True,
+                    ttl_dns_cache=self.dns_cache_ttl,
+                )
+                self._session = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config()])
+                logger.debug("Created pooled OpenAI HTTP session")
+        return self._session
+
+    async def install(self):
+        """현재 태스크(와 여기서 파생되는 태스크)의 OpenAI 비동기 호출이 공용 세션을 쓰도록 한다."""
+        session = await self.session()
+        async with self._session_lock:
+            self.consumers += 1
+        openai.aiosession.set(session)
+
+    async def release(self):
+        """install 한 웹소켓 연결이 끊길 때 부른다. 마지막 연결이면 aiohttp 세션을 닫는다."""
+        async with self._session_lock:
+            self.consumers = max(self.consumers - 1, 0)
+            if self.consumers == 0 and self._session is not None and not self._session.closed:
+                await self._session.close()
+                logger.debug("Closed pooled OpenAI HTTP session")
+
+    def close_sync(self):
+        # 프로세스 종료 시에는 동기 세션만 닫는다. aiohttp 세션은 release 에서 이벤트 루프 안에서 닫는다.
+        self.sync_session.close()
+
+    def stats(self) -> dict:
+        connector = self._session.connector if self._session is not None and not self._session.closed else None
+        return {
+            'limit': self.limit,
+            'limit_per_host': self.limit_per_host,
+            'consumers': self.consumers,
+            'in_use': len(connector._acquired) if connector else 0,
+            'idle': sum(len(conns) for conns in connector._conns.values()) if connector else 0,
+            'requests': self.requests,
+            'connections_created': self.connections_created,
+            'connections_reused': self.connections_reused,
+        }
+
+
+_pool: Optional[OpenAIHttpPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_openai_http_pool() -> OpenAIHttpPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OpenAIHttpPool(
+                    limit=settings.OPENAI_HTTP_LIMIT,
+                    limit_per_host=settings.OPENAI_HTTP_LIMIT_PER_HOST,
+                    keepalive_timeout=settings.OPENAI_HTTP_KEEPALIVE_TIMEOUT,
+                    dns_cache_ttl=settings.OPENAI_HTTP_DNS_CACHE_TTL,
+                )
+                atexit.register(_pool.close_sync)
+    return _pool
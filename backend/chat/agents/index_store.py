@@ -0,0 +1,154 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from chat.agents.ann_index import IndexSpec, build_index, configure_search, normalize
+
+logger = logging.getLogger(__name__)
+
+
+class IndexStore:
+    """
+    문서 임베딩 행렬(float32 .npy)과 직렬화된 FAISS 인덱스를 디스크에 보관한다.
+    QA.csv 내용, 토크나이저, 임베딩 제공자와 모델 이름, 인덱스 설정의 해시가 같으면 OpenAI 호출 없이 파일을 그대로 읽는다.
+    인덱스 설정만 바뀐 경우에는 이전 산출물의 임베딩을 재사용해 인덱스만 다시 만든다.
+    """
+
+    EMBEDDINGS_FILE = 'embeddings.npy'
+    INDEX_FILE = 'index.faiss'
+    META_FILE = 'meta.json'
+
+    def __init__(self, root_dir: str, csv_path: str, tokenizer_id: str, model_name: str,
+                 index_spec: IndexSpec = IndexSpec(), provider: str = 'openai'):
+        self.root_dir = root_dir
+        self.csv_path = csv_path
+        self.tokenizer_id = tokenizer_id
+        self.model_name = model_name
+        self.provider = provider
+        self.index_spec = index_spec
+        self.key = self._corpus_key()
+        self.path = os.path.join(root_dir, self.key)
+        # 임베딩 도중 멈추면 여기 남은 진행 상황에서 이어서 임베딩한다.
+        self.checkpoint_dir = os.path.join(root_dir, f".embedding-{self.key}")
+
+    def _corpus_key(self) -> str:
+        digest = hashlib.sha256()
+        with open(self.csv_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                digest.update(chunk)
+        digest.update(self.tokenizer_id.encode('utf-8'))
+        digest.update(self.provider.encode('utf-8'))
+        digest.update(self.model_name.encode('utf-8'))
+        digest.update(self.index_spec.identifier.encode('utf-8'))
+        return digest.hexdigest()[:32]
+
+    def load(self) -> Optional[Tuple[np.ndarray, faiss.Index]]:
+        embeddings_path = os.path.join(self.path, self.EMBEDDINGS_FILE)
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        if not (os.path.exists(embeddings_path) and os.path.exists(index_path)):
+            return None
+        logger.debug(f"Loading index artifacts from {self.path}")
+        # 임베딩 행렬은 메모리 매핑으로 읽어 워커 간에 페이지 캐시를 공유한다.
+        doc_embeddings = np.load(embeddings_path, mmap_mode='r')
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+        except RuntimeError:
+            # 메모리 매핑을 지원하지 않는 인덱스 종류(HNSW 등)는 일반 방식으로 읽는다.
+            index = faiss.read_index(index_path)
+        configure_search(index, self.index_spec)
+        return doc_embeddings, index
+
+    def save(self, tokenized_titles: List[str], doc_embeddings: np.ndarray, index: faiss.Index):
+        os.makedirs(self.root_dir, exist_ok=True)
+        # 다른 워커가 반쯤 쓰인 파일을 읽지 않도록 임시 디렉터리에 쓴 뒤 한 번에 옮긴다.
+        tmp_dir = tempfile.mkdtemp(prefix=f".{self.key}-", dir=self.root_dir)
+        try:
+            np.save(os.path.join(tmp_dir, self.EMBEDDINGS_FILE), doc_embeddings)
+            faiss.write_index(index, os.path.join(tmp_dir, self.INDEX_FILE))
+            with open(os.path.join(tmp_dir, self.META_FILE), 'w', encoding='utf-8') as file:
+                json.dump({
+                    'tokenizer': self.tokenizer_id,
+                    'provider': self.provider,
+                    'model': self.model_name,
+                    'index': self.index_spec.identifier,
+                    'titles': tokenized_titles,
+                }, file, ensure_ascii=False)
+            os.replace(tmp_dir, self.path)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(self.path):
+                raise
+        logger.debug(f"Saved index artifacts to {self.path}")
+
+    def _reusable_embeddings(self) -> Dict[str, np.ndarray]:
+        # 같은 토크나이저/모델로 만든 이전 산출물에서 제목별 임베딩을 모은다.
+        reusable = {}
+        if not os.path.isdir(self.root_dir):
+            return reusable
+        for name in os.listdir(self.root_dir):
+            meta_path = os.path.join(self.root_dir, name, self.META_FILE)
+            if name.startswith('.') or not os.path.exists(meta_path):
+                continue
+            try:
+                with open(meta_path, encoding='utf-8') as file:
+                    meta = json.load(file)
+                # provider 가 없는 이전 산출물은 OpenAI 로 만든 것이다.
+                if (meta.get('tokenizer') != self.tokenizer_id or meta.get('provider', 'openai') != self.provider
+                        or meta.get('model') != self.model_name):
+                    continue
+                matrix = np.load(os.path.join(self.root_dir, name, self.EMBEDDINGS_FILE), mmap_mode='r')
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable index artifacts in {name}: {e}")
+                continue
+            for title, row in zip(meta['titles'], matrix):
+                reusable.setdefault(title, row)
+        return reusable
+
+    def load_or_build(
+        self,
+        documents: List[dict],
+        tokenize_batch: Callable[[List[str]], List[str]],
+        embed_documents: Callable[[List[str], str], np.ndarray],
+    ) -> Tuple[np.ndarray, faiss.Index]:
+        """embed_documents(texts, checkpoint_dir) 는 texts 순서대로 float32 행렬을 반환해야 한다."""
+        loaded = self.load()
+        if loaded is not None:
+            return loaded
+
+        os.makedirs(self.root_dir, exist_ok=True)
+        # 같은 코퍼스를 여러 워커가 동시에 임베딩하지 않도록 파일 락을 잡고, 그 사이 다른 워커가 만들었는지 다시 본다.
+        with open(os.path.join(self.root_dir, f".{self.key}.lock"), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            loaded = self.load()
+            if loaded is not None:
+                return loaded
+            return self._build(documents, tokenize_batch, embed_documents)
+
+    def _build(self, documents, tokenize_batch, embed_documents) -> Tuple[np.ndarray, faiss.Index]:
+        tokenized_titles = tokenize_batch([doc['title'] for doc in documents])
+        reusable = self._reusable_embeddings()
+        missing = sorted({title for title in tokenized_titles if title not in reusable})
+        logger.info(f"Embedding {len(missing)} of {len(tokenized_titles)} titles, reusing the rest")
+        if missing:
+            for title, row in zip(missing, embed_documents(missing, self.checkpoint_dir)):
+                reusable[title] = row
+
+        # 미리 할당한 float32 행렬에 제목 순서대로 채운다.
+        dimension = len(next(iter(reusable.values())))
+        doc_embeddings = np.empty((len(tokenized_titles), dimension), dtype='float32')
+        for row, title in enumerate(tokenized_titles):
+            doc_embeddings[row] = reusable[title]
+        # 코사인 유사도로 검색하도록 정규화한 벡터로 인덱스를 만든다. 원래 임베딩은 그대로 저장한다.
+        index = build_index(normalize(doc_embeddings), self.index_spec)
+        logger.info(f"Built {self.index_spec.identifier} index over {index.ntotal} documents")
+        self.save(tokenized_titles, doc_embeddings, index)
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        return self.load()
@@ -0,0 +1,65 @@
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class BM25Index:
+    """
+    Mecab 형태소로 만든 BM25 역색인.
+    용어마다 (문서 번호, BM25 가중치) 목록을 미리 계산해 두므로 검색은 질의 용어의 목록을 더하기만 한다.
+    """
+
+    def __init__(self, documents_tokens: Sequence[Sequence[str]], k1: float = 1.5, b: float = 0.75):
+        self.size = len(documents_tokens)
+        lengths = np.array([len(tokens) for tokens in documents_tokens], dtype='float32')
+        average_length = float(lengths.mean()) if self.size else 0.0
+
+        frequencies: Dict[str, Dict[int, int]] = {}
+        for doc_id, tokens in enumerate(documents_tokens):
+            for token in tokens:
+                postings = frequencies.setdefault(token, {})
+                postings[doc_id] = postings.get(doc_id, 0) + 1
+
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for token, postings in frequencies.items():
+            ids = np.fromiter(postings.keys(), dtype='int64', count=len(postings))
+            tf = np.fromiter(postings.values(), dtype='float32', count=len(postings))
+            idf = math.log(1 + (self.size - len(postings) + 0.5) / (len(postings) + 0.5))
+            norm = k1 * (1 - b + b * lengths[ids] / average_length) if average_length else k1
+            self._postings[token] = (ids, idf * tf * (k1 + 1) / (tf + norm))
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._postings)
+
+    def search(self, query_tokens: Iterable[str], k: int, doc_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """점수가 높은 순서로 (문서 번호, 점수)를 반환한다. doc_ids 가 있으면 그 문서들 안에서만 찾는다."""
+        scores = np.zeros(self.size, dtype='float32')
+        for token in set(query_tokens):
+            postings = self._postings.get(token)
+            if postings is not None:
+                scores[postings[0]] += postings[1]
+        candidates = doc_ids if doc_ids is not None else np.arange(self.size)
+        candidate_scores = scores[candidates]
+        order = np.argsort(-candidate_scores, kind='stable')[:k]
+        return [(int(candidates[i]), float(candidate_scores[i])) for i in order if candidate_scores[i] > 0]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[int]:
+    """여러 검색 결과 순위를 1 / (k + 순위) 의 합으로 합친다."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])
+
+
+def is_decisive(hits: List[Tuple[int, float]], min_score: float, margin: float) -> bool:
+    """
+    어휘 검색만으로 충분한지 판단한다.
+    1위 점수가 min_score 이상이고, 2위보다 margin 배 이상 높으면 확실한 일치로 본다.
+    """
+    if not hits or hits[0][1] < min_score:
+        return False
+    return len(hits) == 1 or hits[0][1] >= margin * hits[1][1]
@@ -0,0 +1,81 @@
+from typing import Any, Callable, List
+
+from langchain.chat_models import ChatOpenAI
+from langchain.memory import ConversationBufferMemory
+from langchain.schema import BaseMessage, SystemMessage, get_buffer_string
+
+from chat.agents.openai_async import apredict
+from chat.models import ChatMessage, MessageSender
+
+SUMMARY_PROMPT = """Progressively summarize the lines of conversation provided, adding onto the previous summary and returning a new summary.
+Write the summary in Korean and keep the buildings, places and facts the user asked about.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+
+
+class BoundedConversationMemory(ConversationBufferMemory):
+    """
+    최근 max_messages 개의 메시지 중 max_tokens 안에 들어가는 것만 프롬프트에 넣고,
+    그 이전 대화는 Chat 에 저장된 누적 요약(summary) 한 덩어리로 대신한다.
+    대화가 길어져도 LLM 에 보내는 프롬프트 크기가 일정하게 유지된다.
+    """
+
+    max_messages: int = 20
+    max_tokens: int = 2000
+    summary: str = ""
+    token_counter: Callable[[str], int] = len
+
+    def _window(self) -> List[BaseMessage]:
+        window = []
+        used = 0
+        for message in reversed(self.chat_memory.messages[-self.max_messages:]):
+            used += self.token_counter(message.content)
+            if window and used > self.max_tokens:
+                break
+            window.append(message)
+        window.reverse()
+        return window
+
+    @property
+    def buffer(self) -> Any:
+        messages = self._window()
+        if self.summary:
+            messages = [SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}")] + messages
+        if self.return_messages:
+            return messages
+        return get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+
+    def trim(self):
+        # 창 밖으로 밀려난 메시지는 요약에 반영된 뒤 메모리에서도 버린다.
+        del self.chat_memory.messages[:-self.max_messages]
+
+
+def summary_batch(messages: List[ChatMessage], max_tokens: int, token_counter: Callable[[str], int]) -> List[ChatMessage]:
+    """
+    오래된 순서로 max_tokens 안에 들어가는 메시지만 고른다 (최소 한 개).
+    긴 대화의 첫 요약도 한 번의 프롬프트가 모델 한도를 넘지 않고, 나머지는 다음 요약에서 이어서 반영된다.
+    """
+    batch = []
+    used = 0
+    for message in messages:
+        used += token_counter(message.content)
+        if batch and used > max_tokens:
+            break
+        batch.append(message)
+    return batch
+
+
+async def summarize_messages(llm: ChatOpenAI, summary: str, messages: List[ChatMessage]) -> str:
+    # 기존 요약에 새로 밀려난 메시지만 덧붙여 요약하므로 매번 전체 대화를 다시 요약하지 않는다.
+    lines = []
+    for message in messages:
+        prefix = "Human" if message.sender == MessageSender.USER.value else "AI"
+        lines.append(f"{prefix}: {message.content}")
+    prompt = SUMMARY_PROMPT.format(summary=summary or "(none)", new_lines="\n".join(lines))
+    return (await apredict(llm, prompt)).strip()
@@ -0,0 +1,62 @@
+"""
+langchain 0.0.176 에는 apredict_messages/apredict 와 OpenAIEmbeddings.aembed_query/aembed_documents 가 없으므로
+agenerate 와 openai.Embedding.acreate 로 같은 역할을 하는 비동기 함수를 둔다.
+"""
+import logging
+from typing import List
+
+import openai
+from langchain.base_language import BaseLanguageModel
+from langchain.callbacks.manager import Callbacks
+from langchain.embeddings import OpenAIEmbeddings
+from langchain.schema import BaseMessage, HumanMessage
+from tenacity import before_sleep_log, retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+logger = logging.getLogger(__name__)
+
+# langchain 의 embed_with_retry 와 같은 정책: 일시적인 OpenAI 오류는 4~10초 지수 백오프로 max_retries 번까지 시도한다.
+RETRYABLE_ERRORS = (
+    openai.error.Timeout,
+    openai.error.APIError,
+    openai.error.APIConnectionError,
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+)
+
+
+def _retry(max_retries: int):
+    return retry(
+        reraise=True,
+        stop=stop_after_attempt(max_retries),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(RETRYABLE_ERRORS),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+    )
+
+
+async def apredict_messages(llm: BaseLanguageModel, messages: List[BaseMessage], callbacks: Callbacks = None) -> BaseMessage:
+    result = await llm.agenerate([messages], callbacks=callbacks)
+    return result.generations[0][0].message
+
+
+async def apredict(llm: BaseLanguageModel, text: str, callbacks: Callbacks = None) -> str:
+    message = await apredict_messages(llm, [HumanMessage(content=text)], callbacks=callbacks)
+    return message.content
+
+
+async def aembed_documents(embeddings: OpenAIEmbeddings, texts: List[str]) -> List[List[float]]:
+    # OpenAIEmbeddings.embed_documents 와 같이 줄바꿈을 공백으로 바꾼 뒤 한 번의 요청으로 임베딩한다.
+    @_retry(embeddings.max_retries)
+    async def acreate():
+        return await openai.Embedding.acreate(
+            input=[text.replace("\n", " ") for text in texts],
+            model=embeddings.model,
+            api_key=embeddings.openai_api_key,
+        )
+
+    response = await acreate()
+    return [item["embedding"] for item in sorted(response["data"], key=lambda item: item["index"])]
+
+
+async def aembed_query(embeddings: OpenAIEmbeddings, text: str) -> List[float]:
+    return (await aembed_documents(embeddings, [text]))[0]
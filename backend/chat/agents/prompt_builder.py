@@ -0,0 +1,117 @@
+import logging
+import re
+import threading
+from typing import List, NamedTuple, Sequence
+
+import tiktoken
+from langchain.schema import BaseMessage, HumanMessage, SystemMessage
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class AssembledPrompt(NamedTuple):
+    messages: List[BaseMessage]
+    passages: List[str]  # 실제로 프롬프트에 들어간 (중복 제거, 잘린) 문서
+    prompt_tokens: int
+
+
+class PromptBuilder:
+    """
+    RAG 답변 생성용 프롬프트를 토큰 한도 안에서 조립한다.
+    시스템 메시지는 항상 같은 바이트로 맨 앞에 두어 OpenAI 의 프롬프트 prefix 캐시가 적용되게 하고,
+    검색된 문서는 중복을 빼고 문서당 max_passage_tokens 로 자른 뒤 순위대로 남은 예산만큼만 넣는다.
+    """
+
+    # 채팅 메시지 하나당 붙는 role/구분자 토큰과 답변 시작 토큰 (OpenAI cookbook 기준)
+    TOKENS_PER_MESSAGE = 3
+    TOKENS_PER_REPLY = 3
+
+    def __init__(self, system_message: str, model_name: str, max_prompt_tokens: int = 3000,
+                 max_passage_tokens: int = 400):
+        self.system_message = system_message
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_passage_tokens = max_passage_tokens
+        try:
+            self.encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+        self._system_tokens = self.count_tokens(system_message) + self.TOKENS_PER_MESSAGE
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.total_prompt_tokens = 0
+        self.max_seen_tokens = 0
+        self.truncated_passages = 0
+        self.dropped_passages = 0
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens])
+
+    @staticmethod
+    def _dedupe(passages: Sequence[str]) -> List[str]:
+        # 공백만 다른 문서나 다른 문서에 통째로 포함된 문서는 한 번만 넣는다.
+        unique = []
+        normalized = []
+        for passage in passages:
+            key = _WHITESPACE.sub(' ', passage).strip()
+            if not key or any(key in seen for seen in normalized):
+                continue
+            contained = [i for i, seen in enumerate(normalized) if seen in key]
+            if contained:
+                # 더 긴 문서가 앞 순위의 짧은 문서 자리를 대신한다.
+                first = contained[0]
+                normalized[first], unique[first] = key, passage.strip()
+                for i in reversed(contained[1:]):
+                    del normalized[i], unique[i]
+                continue
+            normalized.append(key)
+            unique.append(passage.strip())
+        return unique
+
+    def build(self, query: str, passages: Sequence[str]) -> AssembledPrompt:
+        unique = self._dedupe(passages)
+        query_tokens = self.count_tokens(query)
+        budget = self.max_prompt_tokens - self._system_tokens - query_tokens - self.TOKENS_PER_MESSAGE - self.TOKENS_PER_REPLY
+
+        included = []
+        truncated = 0
+        for passage in unique:
+            # 문서 사이 구분자(줄바꿈 두 개)도 예산에 포함한다.
+            allowed = min(self.max_passage_tokens, budget - 1)
+            if allowed <= 0:
+                break
+            clipped = self._truncate(passage, allowed)
+            if clipped != passage:
+                truncated += 1
+            included.append(clipped)
+            budget -= self.count_tokens(clipped) + 1
+
+        content = "\n\n".join(included + [query])
+        prompt_tokens = (self._system_tokens + self.count_tokens(content)
+                         + self.TOKENS_PER_MESSAGE + self.TOKENS_PER_REPLY)
+        with self._lock:
+            self.requests += 1
+            self.total_prompt_tokens += prompt_tokens
+            self.max_seen_tokens = max(self.max_seen_tokens, prompt_tokens)
+            self.truncated_passages += truncated
+            self.dropped_passages += len(passages) - len(included)
+        messages = [SystemMessage(content=self.system_message), HumanMessage(content=content)]
+        return AssembledPrompt(messages, included, prompt_tokens)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'system_tokens': self._system_tokens,
+                'avg_prompt_tokens': self.total_prompt_tokens / self.requests if self.requests else 0.0,
+                'max_prompt_tokens': self.max_seen_tokens,
+                'truncated_passages': self.truncated_passages,
+                'dropped_passages': self.dropped_passages,
+            }
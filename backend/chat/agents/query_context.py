@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import NamedTuple, Optional, Tuple
+
+from chat.agents.building_matcher import BuildingMatch
+
+
+class QueryContext(NamedTuple):
+    """
+    사용자 메시지 하나에 대해 한 번만 계산하는 값들.
+    에이전트, RAG 도구, 검색, 로깅이 모두 이 객체를 공유해 형태소 분석과 건물 매칭을 반복하지 않는다.
+    """
+    message_id: str
+    query: str
+    nouns: Tuple[str, ...]
+    building: Optional[BuildingMatch]
+    normalized_query: str = ""  # 형태소 단위로 띄어 쓴 질의 (캐시/요청 병합 키)
+
+    @property
+    def canonical_building(self) -> Optional[str]:
+        return self.building.canonical_name if self.building else None
+
+
+# 지금 처리 중인 메시지의 컨텍스트. 공용 에이전트의 RAG 도구가 연결(태스크)별로 읽는다.
+current_query_context: ContextVar[Optional[QueryContext]] = ContextVar('current_query_context', default=None)
+
+
+class QueryContextCache:
+    """메시지 id 별 QueryContext 를 보관하는 작은 LRU 캐시"""
+
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self._contexts = OrderedDict()
+
+    def get(self, message_id: str) -> Optional[QueryContext]:
+        context = self._contexts.get(message_id)
+        if context is not None:
+            self._contexts.move_to_end(message_id)
+        return context
+
+    def put(self, context: QueryContext):
+        self._contexts[context.message_id] = context
+        self._contexts.move_to_end(context.message_id)
+        while len(self._contexts) > self.max_size:
+            self._contexts.popitem(last=False)
@@ -0,0 +1,25 @@
+def format_response(response: str) -> str:
+    """응답 형식을 정리하는 함수"""
+    formatted_response = response.replace("content='", "").replace("' additional_kwargs={} example=False", "").replace("\\n", "\n")
+    formatted_response = formatted_response.replace("**", "")  # Markdown 문법 제거
+    return formatted_response
+
+
+class IncrementalResponseFormatter:
+    """
+    스트리밍 토큰에 format_response 와 같은 정리를 적용한다.
+    '**' 나 '\\n' 이 토큰 경계에 걸칠 수 있으므로 끝의 '*', '\\' 는 다음 토큰이 올 때까지 보류한다.
+    """
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, token: str) -> str:
+        text = self._pending + token
+        ready = text.rstrip("*\\")
+        self._pending = text[len(ready):]
+        return format_response(ready)
+
+    def finish(self) -> str:
+        text, self._pending = self._pending, ""
+        return format_response(text)
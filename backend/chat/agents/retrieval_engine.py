@@ -0,0 +1,296 @@
+import logging
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from backend.project import settings
+from chat.agents.ann_index import IndexSpec, normalize
+from chat.agents.answer_cache import get_answer_cache
+from chat.agents.building_partitions import BuildingPartitions
+from chat.agents.building_matcher import BuildingMatch, BuildingMatcher
+from chat.agents.buildings import KOREA_UNIVERSITY_BUILDINGS
+from chat.agents.corpus_embedder import CorpusEmbedder
+from chat.agents.embedding_cache import QueryEmbeddingCache
+from chat.agents.embedding_providers import EmbeddingProvider, create_embedding_provider
+from chat.agents.executors import run_cpu
+from chat.agents.index_store import IndexStore
+from chat.agents.lexical_index import BM25Index, is_decisive, reciprocal_rank_fusion
+from chat.agents.prompt_builder import PromptBuilder
+from chat.agents.query_context import QueryContext
+from chat.agents.tokenizer import get_tokenizer
+from chat.utils import load_documents_from_csv, CSV_FILE_PATH
+
+logger = logging.getLogger(__name__)
+
+# 시스템 메시지 설정
+SYSTEM_MESSAGE = """
+        You are a knowledgeable assistant specializing in providing information about Korea University.
+        You should respond in Korean and provide information about the buildings and locations within Korea University.
+        If you receive an inquiry about a location or building that does not exist within Korea University, respond to the user by prefacing your answer with information that the location or building may not be part of Korea University. Do not simply say no.
+        If you don't know the answer to a question, simply say you don't know.
+        Do Not convey inaccurate information. Do not pass on information that you are not sure about.
+
+        List of buildings at Korea University:
+        """ + ", ".join(KOREA_UNIVERSITY_BUILDINGS)
+
+
+class RetrievalEngine:
+    """
+    문서, FAISS 인덱스, 건물 키워드, 시스템 프롬프트를 묶은 검색 엔진.
+    프로세스당 한 번만 만들어 모든 ChatConsumer 가 공유하며, 생성 후에는 변경하지 않는다.
+    """
+
+    TOP_K = 3  # 프롬프트에 넣을 문서 수
+    CANDIDATES = 10  # 순위 결합 전에 각 검색에서 가져올 후보 수
+
+    def __init__(self, documents, tokenizer, embeddings: EmbeddingProvider, doc_embeddings, index, system_message: str,
+                 query_cache: QueryEmbeddingCache = None, corpus_key: str = ''):
+        self.corpus_key = corpus_key
+        self.tokenizer = tokenizer
+        self.building_matcher = BuildingMatcher(KOREA_UNIVERSITY_BUILDINGS, tokenizer)
+        self.documents = tuple(self._tag_documents(documents))
+        self.embeddings = embeddings
+        self.query_cache = query_cache or QueryEmbeddingCache(
+            embeddings.embed_query, embeddings.model, aembed_query=embeddings.aembed_query
+        )
+        self.doc_embeddings = doc_embeddings
+        self.index = index
+        self.partitions = BuildingPartitions(
+            doc_embeddings, [doc['building'] for doc in self.documents], IndexSpec.from_settings(settings)
+        )
+        # FAISS 인덱스 옆에 같은 문서 순서로 제목 + 내용 형태소의 BM25 역색인을 둔다.
+        self.lexical_index = BM25Index(tokenizer.batch_morphs(
+            [f"{doc['title']} {doc['content']}" for doc in self.documents]
+        ))
+        self._counts = {'lexical_only': 0, 'hybrid': 0, 'vector_only': 0}
+        self._counts_lock = threading.Lock()
+        self.system_message = system_message
+        self.prompt_builder = PromptBuilder(
+            system_message,
+            settings.OPENAI_CHAT_MODEL,
+            max_prompt_tokens=settings.PROMPT_MAX_TOKENS,
+            max_passage_tokens=settings.PROMPT_MAX_PASSAGE_TOKENS,
+        )
+        self.answer_cache = get_answer_cache(corpus_key)
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError("RetrievalEngine is immutable once built")
+        super().__setattr__(name, value)
+
+    def _tag_documents(self, documents):
+        # 적재할 때 문서마다 정식 건물 이름을 붙인다. 제목에서 못 찾으면 내용에서 찾는다.
+        # 유사도 매칭은 다른 건물 파티션에 문서를 넣을 수 있으므로 정식 이름이나 별칭이 있을 때만 붙인다.
+        for document in documents:
+            building = document.get('building')
+            if not building:
+                matcher = self.building_matcher
+                match = matcher.match_exact(document['title']) or matcher.match_exact(document['content'])
+                building = match.canonical_name if match else None
+            yield dict(document, building=building)
+
+    @classmethod
+    def build(cls, csv_path: str = CSV_FILE_PATH) -> "RetrievalEngine":
+        logger.debug("Building retrieval engine")
+        documents = load_documents_from_csv(csv_path)
+        tokenizer = get_tokenizer()
+        embeddings = create_embedding_provider()
+        doc_embeddings, index, corpus_key = cls._load_or_create_index(csv_path, documents, tokenizer, embeddings)
+        query_cache = QueryEmbeddingCache(
+            embeddings.embed_query,
+            embeddings.model,
+            aembed_query=embeddings.aembed_query,
+            max_size=settings.QUERY_EMBEDDING_CACHE_SIZE,
+            ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+            redis_url=settings.REDIS_URL if settings.QUERY_EMBEDDING_CACHE_REDIS else None,
+        )
+        return cls(documents, tokenizer, embeddings, doc_embeddings, index, SYSTEM_MESSAGE, query_cache, corpus_key)
+
+    @staticmethod
+    def _corpus_embedder(embeddings: EmbeddingProvider) -> CorpusEmbedder:
+        return CorpusEmbedder(
+            embeddings,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_concurrency=settings.EMBEDDING_MAX_CONCURRENCY,
+            tokens_per_minute=settings.EMBEDDING_TOKENS_PER_MINUTE,
+            max_retries=settings.EMBEDDING_MAX_RETRIES,
+        )
+
+    @classmethod
+    def _load_or_create_index(cls, csv_path, documents, tokenizer, embeddings):
+        logger.debug("Loading or creating embeddings and index")
+        store = IndexStore(
+            root_dir=settings.RETRIEVAL_INDEX_DIR,
+            csv_path=csv_path,
+            tokenizer_id=tokenizer.identifier,
+            model_name=embeddings.model,
+            provider=embeddings.name,
+            index_spec=IndexSpec.from_settings(settings),
+        )
+        # 한국어 텍스트 전처리 후 바뀐 제목만 설정된 임베딩 제공자로 임베딩한다.
+        doc_embeddings, index = store.load_or_build(
+            documents,
+            tokenize_batch=lambda titles: [" ".join(morphs) for morphs in tokenizer.batch_morphs(titles)],
+            embed_documents=cls._corpus_embedder(embeddings).embed,
+        )
+        logger.debug(f"Document embeddings shape: {doc_embeddings.shape}")
+        return doc_embeddings, index, store.key
+
+    def build_query_context(self, message_id: str, query: str) -> QueryContext:
+        # 명사 추출과 건물 매칭은 메시지당 한 번만 수행한다.
+        nouns = tuple(self.tokenizer.nouns(query))
+        building = self.match_building(query, list(nouns))
+        normalized_query = " ".join(self.tokenizer.morphs(query))
+        context = QueryContext(message_id, query, nouns, building, normalized_query)
+        logger.debug(f"Query context for message {message_id}: building={context.canonical_building}, nouns={nouns}")
+        return context
+
+    async def abuild_query_context(self, message_id: str, query: str) -> QueryContext:
+        return await run_cpu(self.build_query_context, message_id, query)
+
+    def _resolve_building(self, query: str, context: QueryContext = None) -> Optional[str]:
+        return context.canonical_building if context else self.check_building_existence(query)
+
+    def _tokenize_retrieval_query(self, query: str, building: Optional[str]) -> str:
+        if building:
+            query = query.replace(query, building)  # 정식 명칭으로 대체
+        tokenized_query = " ".join(self.tokenizer.morphs(query))
+        logger.debug(f"Tokenized query: {tokenized_query}")
+        return tokenized_query
+
+    def _lexical_search(self, query: str, context: QueryContext = None, building: Optional[str] = None):
+        # 건물 이름으로 바꾸기 전의 원래 질문 형태소로 제목과 내용을 찾는다.
+        tokens = context.normalized_query.split() if context and context.normalized_query else self.tokenizer.morphs(query)
+        return self.lexical_index.search(tokens, k=self.CANDIDATES, doc_ids=self.partitions.doc_ids(building))
+
+    def is_lexical_decisive(self, lexical_hits) -> bool:
+        return bool(lexical_hits) and settings.LEXICAL_FAST_PATH and is_decisive(
+            lexical_hits, settings.LEXICAL_FAST_PATH_MIN_SCORE, settings.LEXICAL_FAST_PATH_MARGIN)
+
+    def _lexical_fast_path(self, lexical_hits) -> Optional[List[str]]:
+        # 어휘 일치가 확실하면 임베딩 호출 없이 어휘 검색 결과만으로 답한다.
+        if not self.is_lexical_decisive(lexical_hits):
+            return None
+        self._count('lexical_only')
+        return self._contents([doc_id for doc_id, _ in lexical_hits[:self.TOP_K]])
+
+    def _search(self, query: str, query_embedding: np.ndarray, building: Optional[str] = None,
+                lexical_hits=None) -> List[str]:
+        logger.debug(f"Query embedding shape: {query_embedding.shape}")
+        # 건물이 정해졌으면 그 건물 문서만, 아니면 전체 인덱스에서 검색
+        query_vector = normalize(query_embedding)
+        doc_ids = self.partitions.search(building, query_vector, k=self.CANDIDATES)
+        if doc_ids is None:
+            D, I = self.index.search(query_vector, k=self.CANDIDATES)
+            doc_ids = [i for i in I[0] if i >= 0]
+        if lexical_hits:
+            # 벡터 검색과 어휘 검색 순위를 reciprocal rank fusion 으로 합친다.
+            self._count('hybrid')
+            doc_ids = reciprocal_rank_fusion([doc_ids, [doc_id for doc_id, _ in lexical_hits]], k=settings.RETRIEVAL_RRF_K)
+        else:
+            self._count('vector_only')
+        matching_documents = self._contents(doc_ids[:self.TOP_K])
+        logger.debug(f"Query: {query}, Building: {building}, Matched {len(matching_documents)} documents: {matching_documents}")
+        return matching_documents
+
+    def _contents(self, doc_ids: List[int]) -> List[str]:
+        return [self.documents[i]['content'] for i in doc_ids]
+
+    def _count(self, name: str):
+        with self._counts_lock:
+            self._counts[name] += 1
+
+    def retrieve_documents(self, query: str, context: QueryContext = None):
+        logger.debug(f"Retrieving documents for query: {query}")
+        building = self._resolve_building(query, context)
+        lexical_hits = self._lexical_search(query, context, building) if settings.RETRIEVAL_HYBRID else None
+        fast = self._lexical_fast_path(lexical_hits) if lexical_hits else None
+        if fast is not None:
+            return fast
+        tokenized_query = self._tokenize_retrieval_query(query, building)
+        # 같은 질문이 반복되므로 정규화된 질의 기준으로 캐시된 임베딩을 먼저 사용한다.
+        query_embedding = self.query_cache.get_or_embed(tokenized_query)
+        return self._search(query, query_embedding, building, lexical_hits)
+
+    async def alexical_search(self, query: str, context: QueryContext = None):
+        """하이브리드 검색이 켜져 있으면 어휘 검색 결과를, 꺼져 있으면 None 을 반환한다."""
+        if not settings.RETRIEVAL_HYBRID:
+            return None
+        building = context.canonical_building if context else await run_cpu(self.check_building_existence, query)
+        return await run_cpu(self._lexical_search, query, context, building)
+
+    async def aretrieve_documents(self, query: str, context: QueryContext = None, lexical_hits=None):
+        # 형태소 분석과 FAISS/BM25 검색만 CPU 전용 풀에서 실행하고, 임베딩 호출은 이벤트 루프에서 기다린다.
+        # 답변 캐시 조회 전에 구한 어휘 검색 결과가 있으면 다시 검색하지 않는다.
+        logger.debug(f"Retrieving documents for query: {query}")
+        building = context.canonical_building if context else await run_cpu(self.check_building_existence, query)
+        if lexical_hits is None and settings.RETRIEVAL_HYBRID:
+            lexical_hits = await run_cpu(self._lexical_search, query, context, building)
+        fast = self._lexical_fast_path(lexical_hits) if lexical_hits else None
+        if fast is not None:
+            return fast
+        tokenized_query = await run_cpu(self._tokenize_retrieval_query, query, building)
+        query_embedding = await self.query_cache.aget_or_embed(tokenized_query)
+        return await run_cpu(self._search, query, query_embedding, building, lexical_hits)
+
+    async def aembed_context(self, context: QueryContext) -> np.ndarray:
+        # 답변 캐시 조회용: 건물 이름으로 바꾸지 않은 원래 질문 전체를 임베딩한다.
+        return await self.query_cache.aget_or_embed(context.normalized_query)
+
+    def match_building(self, query: str, query_nouns: List[str] = None) -> Optional[BuildingMatch]:
+        return self.building_matcher.match(query, query_nouns)
+
+    def check_building_existence(self, query: str) -> Optional[str]:
+        match = self.match_building(query)
+        return match.canonical_name if match else None
+
+    @property
+    def building_keywords(self):
+        return self.building_matcher.keywords
+
+    def stats(self) -> dict:
+        return {
+            'documents': len(self.documents),
+            'building_partitions': self.partitions.stats(),
+            'retrieval_paths': dict(self._counts),
+            'lexical_vocabulary': self.lexical_index.vocabulary_size,
+            'query_embedding_cache': self.query_cache.stats(),
+            'tokenizer': self.tokenizer.stats(),
+            'answer_cache': self.answer_cache.stats(),
+            'prompt': self.prompt_builder.stats(),
+        }
+
+    def warm_up(self):
+        # 첫 요청이 느려지지 않도록 형태소 분석기와 FAISS 검색 경로를 미리 실행한다.
+        self.check_building_existence("중앙도서관")
+        self.index.search(normalize(np.ones((1, self.index.d), dtype='float32')), k=1)
+
+
+_engine: Optional[RetrievalEngine] = None
+_engine_lock = threading.Lock()
+_engine_ready = threading.Event()
+
+
+def get_retrieval_engine() -> RetrievalEngine:
+    """프로세스 공용 검색 엔진을 반환한다. 아직 없으면 이 자리에서 만든다."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = RetrievalEngine.build()
+                engine.warm_up()
+                _engine = engine
+                _engine_ready.set()
+                logger.info(f"Retrieval engine ready with {len(engine.documents)} documents")
+    return _engine
+
+
+def warm_up() -> RetrievalEngine:
+    """ASGI 시작 시 호출되어 요청을 받기 전에 검색 엔진을 준비한다."""
+    return get_retrieval_engine()
+
+
+def is_ready() -> bool:
+    return _engine_ready.is_set()
@@ -0,0 +1,67 @@
+import re
+import threading
+from enum import Enum
+from typing import Optional
+
+from backend.project import settings
+from chat.agents.query_context import QueryContext
+
+
+class Route(Enum):
+    NOT_FOUND = 'not_found'  # 고려대학교 건물이 아님
+    DIRECT = 'direct'  # 검색 + LLM 생성 한 번
+    AGENT = 'agent'  # llm-math 를 가진 ReAct 에이전트
+
+
+# 숫자 연산식이나 계산을 요구하는 표현
+ARITHMETIC_PATTERN = re.compile(
+    r'\d\s*[-+*/×÷^%]\s*\d|계산|더하기|빼기|곱하기|나누기|몇\s*배|합계|평균|제곱|\bsqrt\b'
+)
+
+
+class QueryRouter:
+    """
+    에이전트 앞단의 결정적 라우터.
+    건물 매칭이 확실하고 계산이 필요 없는 질문은 에이전트를 거치지 않고 바로 검색 + 생성으로 보내고,
+    계산식이 있거나 건물 매칭이 애매한 질문만 에이전트로 보낸다.
+    """
+
+    def __init__(self, min_fuzzy_score: float = 90, direct_enabled: bool = True):
+        self.min_fuzzy_score = min_fuzzy_score
+        self.direct_enabled = direct_enabled
+        self._lock = threading.Lock()
+        self.counts = {route.value: 0 for route in Route}
+
+    def route(self, context: QueryContext) -> Route:
+        if not context.building:
+            route = Route.NOT_FOUND
+        elif not self.direct_enabled or ARITHMETIC_PATTERN.search(context.query):
+            route = Route.AGENT
+        elif context.building.score < self.min_fuzzy_score:
+            # 정확히 일치한 표기 없이 퍼지 매칭으로만 찾은 경우
+            route = Route.AGENT
+        else:
+            route = Route.DIRECT
+        with self._lock:
+            self.counts[route.value] += 1
+        return route
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+
+_router: Optional[QueryRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_query_router() -> QueryRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = QueryRouter(
+                    min_fuzzy_score=settings.ROUTER_MIN_FUZZY_SCORE,
+                    direct_enabled=settings.ROUTER_DIRECT_ENABLED,
+                )
+    return _router
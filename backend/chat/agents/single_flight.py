@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from backend.project import settings
+
+logger = logging.getLogger(__name__)
+
+# 락을 가진 쪽만 지우도록 토큰을 비교한 뒤 삭제한다.
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    같은 키로 동시에 들어온 요청들이 계산 한 번을 공유하도록 묶는다 (single-flight).
+    프로세스 안에서는 진행 중인 Task 를 함께 기다리고, redis_url 이 있으면 Redis 락과 결과 키로
+    다른 daphne 프로세스의 진행 중 계산 결과도 기다렸다가 받아 간다. 결과는 JSON 으로 직렬화 가능해야 한다.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, lock_ttl: float = 30, result_ttl: float = 5,
+                 poll_interval: float = 0.1):
+        self._redis = aioredis.Redis.from_url(redis_url) if redis_url else None
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.shared = 0
+        self.remote_shared = 0
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        return hashlib.sha1("\x00".join(parts).encode('utf-8')).hexdigest()
+
+    async def do(self, key: str, func: Callable[[], Awaitable]):
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(self._run(key, func))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+            logger.debug(f"Joining in-flight computation {key}")
+        # 먼저 온 요청의 연결이 끊겨도 계산은 계속되도록 shield 로 기다린다.
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def _run(self, key: str, func: Callable[[], Awaitable]):
+        if self._redis is None:
+            return await func()
+        try:
+            return await self._run_distributed(key, func)
+        except redis.RedisError as e:
+            logger.warning(f"Single-flight Redis coordination failed, computing locally: {e}")
+            return await func()
+
+    async def _run_distributed(self, key: str, func: Callable[[], Awaitable]):
+        lock_key = f"single_flight:lock:{key}"
+        result_key = f"single_flight:result:{key}"
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_ttl
+        while True:
+            cached = await self._redis.get(result_key)
+            if cached is not None:
+                self.remote_shared += 1
+                return json.loads(cached)
+
+            token = uuid.uuid4().hex
+            if await self._redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000)):
+                try:
+                    result = await func()
+                    await self._redis.set(result_key, json.dumps(result), px=int(self.result_ttl * 1000))
+                    return result
+                finally:
+                    await self._redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+
+            # 다른 프로세스가 계산 중이다. 너무 오래 걸리면 직접 계산한다.
+            if loop.time() >= deadline:
+                return await func()
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': len(self._inflight),
+            'leaders': self.leaders,
+            'shared': self.shared,
+            'remote_shared': self.remote_shared,
+        }
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight(
+                    redis_url=settings.REDIS_URL if settings.SINGLE_FLIGHT_REDIS else None,
+                    lock_ttl=settings.SINGLE_FLIGHT_LOCK_TTL,
+                )
+    return _single_flight
@@ -0,0 +1,110 @@
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+from konlpy.tag import Mecab
+
+from backend.project import settings
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+
+class MecabTokenizer:
+    """
+    konlpy Mecab 을 감싼 형태소 분석 서비스.
+    스레드마다 별도의 Mecab 인스턴스를 사용해 이벤트 루프와 executor 스레드가 하나의 인스턴스를 공유하지 않고,
+    nouns/morphs 결과는 크기가 제한된 캐시에 보관한다.
+    """
+
+    def __init__(self, dicpath: Optional[str] = None, cache_size: int = 8192):
+        self.dicpath = dicpath
+        self.identifier = f"mecab:{os.path.basename(dicpath or 'default')}"
+        self._local = threading.local()
+        self._instances_lock = threading.Lock()
+        self.instances = 0
+        self._stats_lock = threading.Lock()
+        self._tokens = 0
+        self._seconds = 0.0
+        self._nouns = lru_cache(maxsize=cache_size)(self._uncached_nouns)
+        self._morphs = lru_cache(maxsize=cache_size)(self._uncached_morphs)
+        # 사전 경로가 잘못되었으면 첫 요청이 아니라 시작 시점에 실패하도록 바로 하나 만든다.
+        self._instance()
+
+    def _instance(self) -> Mecab:
+        mecab = getattr(self._local, 'mecab', None)
+        if mecab is None:
+            try:
+                mecab = Mecab(dicpath=self.dicpath)
+            except Exception as e:
+                print("Failed to initialize MeCab. Dictionary path:", self.dicpath)
+                print(str(e))
+                raise
+            self._local.mecab = mecab
+            with self._instances_lock:
+                self.instances += 1
+        return mecab
+
+    def _timed(self, func, text: str) -> Tuple[str, ...]:
+        started = time.perf_counter()
+        tokens = tuple(func(text))
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self._tokens += len(tokens)
+            self._seconds += elapsed
+        return tokens
+
+    def _uncached_nouns(self, text: str) -> Tuple[str, ...]:
+        return self._timed(self._instance().nouns, text)
+
+    def _uncached_morphs(self, text: str) -> Tuple[str, ...]:
+        return self._timed(self._instance().morphs, text)
+
+    def nouns(self, text: str) -> List[str]:
+        return list(self._nouns(text))
+
+    def morphs(self, text: str) -> List[str]:
+        return list(self._morphs(text))
+
+    def batch_morphs(self, texts: List[str]) -> List[List[str]]:
+        # 인덱스 생성 시 제목 목록을 한 번에 처리한다. 중복 제목은 캐시로 한 번만 분석된다.
+        started = time.perf_counter()
+        results = [self.morphs(text) for text in texts]
+        elapsed = time.perf_counter() - started
+        logger.debug(f"Tokenized {len(texts)} texts in {elapsed:.3f}s")
+        return results
+
+    def batch_nouns(self, texts: List[str]) -> List[List[str]]:
+        return [self.nouns(text) for text in texts]
+
+    def stats(self) -> dict:
+        nouns_info = self._nouns.cache_info()
+        morphs_info = self._morphs.cache_info()
+        hits = nouns_info.hits + morphs_info.hits
+        lookups = hits + nouns_info.misses + morphs_info.misses
+        with self._stats_lock:
+            tokens_per_sec = self._tokens / self._seconds if self._seconds else 0.0
+        return {
+            'instances': self.instances,
+            'cache_size': nouns_info.currsize + morphs_info.currsize,
+            'cache_hit_ratio': hits / lookups if lookups else 0.0,
+            'tokens_per_sec': tokens_per_sec,
+        }
+
+
+_tokenizer: Optional[MecabTokenizer] = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer() -> MecabTokenizer:
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                _tokenizer = MecabTokenizer(dicpath=os.getenv('MECAB_PATH'), cache_size=settings.MECAB_CACHE_SIZE)
+    return _tokenizer
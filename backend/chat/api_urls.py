@@ -1,11 +1,13 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
-from .views import ChatViewSet, AgentViewSet
+from .views import ChatViewSet, AgentViewSet, metrics, readiness
 
 router = DefaultRouter()
 router.register(r'chats', ChatViewSet)
 router.register(r'agents', AgentViewSet)
 
 urlpatterns = [
+    path('ready/', readiness, name='readiness'),
+    path('metrics/', metrics, name='metrics'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,19 +1,28 @@
 # consumers.py
+import asyncio
 import json
 import os
 import django
-import asyncio
 import logging
-
-from backend.chat.agents.agent_factory import AgentFactory
-from chat.agents.callbacks import AsyncStreamingCallbackHandler
-from chat.messages.chat_message_repository import ChatMessageRepository
+import uuid
+from typing import List
+
+from backend.chat.agents.agent_factory import AgentFactory, get_agent_template
+from chat.agents.callbacks import AnswerStreamingCallbackHandler, AsyncStreamingCallbackHandler
+from chat.agents.http_pool import get_openai_http_pool
+from chat.agents.openai_async import apredict_messages
+from chat.agents.response_formatter import format_response
+from chat.agents.router import Route, get_query_router
+from chat.agents.single_flight import get_single_flight
+from chat.messages.message_writer import get_message_writer
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.project.settings')
 django.setup()
 
 from channels.generic.websocket import AsyncWebsocketConsumer
 from langchain.agents import AgentExecutor
+from langchain.schema import BaseMessage
+from backend.project import settings
 from chat.models import MessageSender
 
 logger = logging.getLogger(__name__)
@@ -25,32 +34,54 @@ class ChatConsumer(AsyncWebsocketConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.agent_factory = AgentFactory()
-        self.chat_message_repository = ChatMessageRepository()
+        self.message_writer = get_message_writer()
+        self.router = get_query_router()
+        self.single_flight = get_single_flight()
 
     async def connect(self):
         # Get the chat_id from the client
-        chat_id = self.scope['url_route']['kwargs'].get('chat_id')
-
-        # Create the agent when the websocket connection with the client is established
-        self.agent, self.llm = await self.agent_factory.create_agent(
-            tool_names=["llm-math"],
-            chat_id=chat_id,
-            streaming=True,
-            callback_handlers=[AsyncStreamingCallbackHandler(self)],
-        )
-
+        self.chat_id = self.scope['url_route']['kwargs'].get('chat_id')
+        self.agent = None
+        self.llm = None
+        self.stream_handler = AsyncStreamingCallbackHandler(self)
+        self.summary_task = None
+        self.http_pool_installed = False
+
+        # 에이전트는 첫 메시지가 올 때 만들고, 연결은 바로 수락합니다.
         await self.accept()
 
+    async def ensure_agent(self) -> AgentExecutor:
+        if self.agent is None:
+            # 이전 연결에서 아직 기록되지 않은 메시지가 있으면 기록을 불러오기 전에 먼저 저장
+            if self.message_writer.has_pending(self.chat_id):
+                await self.message_writer.flush()
+
+            # OpenAI 호출은 워커 공용 연결 풀을 사용합니다.
+            if not self.http_pool_installed:
+                await get_openai_http_pool().install()
+                self.http_pool_installed = True
+
+            # 공용 에이전트 틀에 이 채팅의 메모리만 묶습니다. 스트리밍 콜백은 실행할 때 넘깁니다.
+            self.agent = await self.agent_factory.create_agent(chat_id=self.chat_id)
+            self.llm = get_agent_template().llm
+        return self.agent
+
     async def disconnect(self, close_code):
-        pass
+        if getattr(self, 'stream_handler', None) is not None:
+            await self.stream_handler.close()
+        await self.message_writer.flush()
+        if getattr(self, 'http_pool_installed', False):
+            await get_openai_http_pool().release()
+            self.http_pool_installed = False
 
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
         message = text_data_json['message']
         chat_id = text_data_json['chat_id']
+        message_id = text_data_json.get('message_id') or uuid.uuid4().hex
 
         # Forward the message to LangChain
-        response_data = await self.message_agent(message, chat_id)
+        response_data = await self.message_agent(message, chat_id, message_id)
         response = response_data["response"]
         retrieved_docs = response_data.get("retrieved_docs", [])
 
@@ -64,12 +95,27 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'retrieved_docs': retrieved_docs
         }))
 
-    async def message_agent(self, message: str, chat_id: str):
-        # Save the user message to the database
-        await self.chat_message_repository.save_message(message=message, sender=MessageSender.USER.value, chat_id=chat_id)
+        # 답변을 보낸 뒤, 메모리 창 밖으로 밀려난 대화를 요약에 반영합니다.
+        # 요약은 LLM 호출이 필요하므로 다음 메시지 처리를 막지 않도록 백그라운드에서 실행합니다.
+        if self.summary_task is None or self.summary_task.done():
+            self.summary_task = asyncio.ensure_future(self.update_memory_summary(chat_id))
+
+    async def update_memory_summary(self, chat_id: str):
+        try:
+            await self.agent_factory.update_memory_summary(chat_id, self.agent.memory)
+        except Exception as e:
+            logger.error(f"Error updating chat summary: {e}")
+
+    async def message_agent(self, message: str, chat_id: str, message_id: str):
+        # 대화 기록을 먼저 불러옵니다. 이번 메시지를 먼저 큐에 넣으면 기록을 불러올 때 함께 flush 되어
+        # 첫 턴 메모리에 같은 질문이 두 번 들어갑니다 (에이전트도 실행 후 입력을 메모리에 추가하므로).
+        await self.ensure_agent()
+
+        # Save the user message to the database (write-behind: 큐에 넣고 바로 진행)
+        await self.message_writer.save_message(message=message, sender=MessageSender.USER.value, chat_id=chat_id)
 
         # Call the agent asynchronously
-        response_data = await self.run_agent_async(message)
+        response_data = await self.run_agent_async(message, message_id)
 
         if isinstance(response_data, str):
             response_data = {"response": response_data, "retrieved_docs": []}
@@ -78,54 +124,90 @@ class ChatConsumer(AsyncWebsocketConsumer):
         formatted_response = self.format_response(response_data["response"])
 
         # Save the AI message to the database
-        await self.chat_message_repository.save_message(message=formatted_response, sender=MessageSender.AI.value, chat_id=chat_id)
+        await self.message_writer.save_message(message=formatted_response, sender=MessageSender.AI.value, chat_id=chat_id)
 
         response_data["response"] = formatted_response
         return response_data
 
-    async def run_agent_async(self, message: str):
-        loop = asyncio.get_event_loop()
+    async def run_agent_async(self, message: str, message_id: str):
         try:
             logger.debug(f"Sending request to OpenAI API with message: {message}")
-            
+
+            # 형태소 분석과 건물 매칭은 여기서 한 번만 하고 이후 단계에서 재사용합니다.
+            context = await self.agent_factory.abuild_query_context(message_id, message)
+            route = self.router.route(context)
+            logger.debug(f"Routing message {message_id} to {route.value}")
+
             # 건물 존재 여부를 체크합니다.
-            if not self.agent_factory.check_building_existence(message):
+            if route is Route.NOT_FOUND:
                 return {"response": "해당 건물이나 장소는 고려대학교에 없습니다.", "retrieved_docs": []}
-            
-            # 건물 존재 여부를 체크한 후에도 유사도 검색을 진행합니다.
-            response_data = await loop.run_in_executor(None, self.agent.run, {"input": message})
-            logger.debug(f"Received response from OpenAI API: {response_data}")
-
-            if isinstance(response_data, str):
-                # 문자열 응답을 json으로 변환
-                response_data = {"action": "Final Answer", "action_input": response_data}
-
-            if isinstance(response_data, dict) and "action" in response_data and response_data["action"] == "Final Answer":
-                logger.debug("Forcing RAGTool call due to 'Final Answer' response.")
-                query = message
-                retrieved_docs = self.agent_factory.retrieve_documents(query)
-                combined_text = " ".join(retrieved_docs + [query])
-                from langchain.schema import HumanMessage
-
-                human_message = HumanMessage(content=combined_text)
-
-                llm_response = await loop.run_in_executor(None, self.llm.predict_messages, [human_message])
-                # 응답 형식 유지
-                final_response_content = str(llm_response[0].content) if isinstance(llm_response, list) and len(llm_response) > 0 else str(llm_response)
-                
-                final_response = {
-                    "response": final_response_content,
-                    "retrieved_docs": retrieved_docs
-                }
-                logger.debug(f"Final LLM response: {final_response}")
+
+            # 단순 건물 질문은 에이전트를 거치지 않고 검색 + 생성 한 번으로 답합니다.
+            if route is Route.DIRECT:
+                # 같은 건물에 대한 비슷한 질문에 이미 답한 적이 있으면 OpenAI 호출 없이 그 답변을 씁니다.
+                # 답변 캐시는 이 경로의 답변만 저장하고 조회하므로, 계산 질문 등에 다른 질문의 답이 섞이지 않습니다.
+                # 어휘 검색을 먼저 해서, 어휘 일치가 확실하면 캐시 조회용 임베딩 호출도 하지 않습니다.
+                lexical_hits = await self.agent_factory.alexical_search(message, context)
+                query_embedding, cached = await self.agent_factory.alookup_answer(context, lexical_hits)
+                if cached is not None:
+                    self.agent.memory.save_context({"input": message}, {"output": cached.answer})
+                    return {"response": cached.answer, "retrieved_docs": cached.retrieved_docs}
+
+                final_response = await self.answer_with_rag_once(message, context, query_embedding, lexical_hits)
+                self.agent.memory.save_context({"input": message}, {"output": final_response["response"]})
                 return final_response
-            return response_data
+
+            # 계산이나 불확실한 건물 질문은 에이전트가 RAG 도구와 llm-math 로 답합니다.
+            # 에이전트의 최종 답변을 그대로 쓰고, RAG 호출을 한 번 더 강제하지 않습니다.
+            # 에이전트와 LLM 호출은 스레드를 점유하지 않도록 비동기로 기다립니다.
+            response = await self.agent.arun({"input": message}, callbacks=[self.stream_handler])
+            logger.debug(f"Received response from OpenAI API: {response}")
+            return {"response": str(response), "retrieved_docs": []}
         except Exception as e:
             logger.error(f"Error running agent: {e}")
             return {"response": "An error occurred while processing your request.", "retrieved_docs": []}
 
+    async def answer_with_rag_once(self, message: str, context, query_embedding, lexical_hits=None):
+        # 같은 건물에 대한 같은 질문이 동시에 들어오면 검색 + 생성을 한 번만 하고 결과를 나눠 씁니다.
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await self.answer_with_rag(message, context, query_embedding, lexical_hits)
+        key = self.single_flight.make_key(context.canonical_building, context.normalized_query)
+        result = await self.single_flight.do(
+            key, lambda: self.answer_with_rag(message, context, query_embedding, lexical_hits)
+        )
+        return dict(result)
+
+    async def answer_with_rag(self, message: str, context, query_embedding, lexical_hits=None):
+        query = message
+        retrieved_docs = await self.agent_factory.aretrieve_documents(query, context, lexical_hits)
+        # 시스템 메시지를 앞에 고정하고, 문서는 토큰 한도 안에서 중복 없이 넣습니다.
+        prompt = self.agent_factory.build_prompt(query, retrieved_docs)
+
+        llm_response = await self.predict_answer(prompt.messages)
+        # 응답 형식 유지
+        final_response_content = str(llm_response[0].content) if isinstance(llm_response, list) and len(llm_response) > 0 else str(llm_response)
+
+        final_response = {
+            "response": final_response_content,
+            "retrieved_docs": retrieved_docs,
+            "prompt_tokens": prompt.prompt_tokens,
+        }
+        logger.debug(f"Final LLM response: {final_response}")
+        self.agent_factory.store_answer(context, query_embedding, final_response_content, retrieved_docs)
+        return final_response
+
+    async def predict_answer(self, messages: List[BaseMessage]):
+        if not settings.ANSWER_STREAMING:
+            return await apredict_messages(self.llm, messages, callbacks=[self.stream_handler])
+
+        # 최종 답변 토큰을 'answer_delta' 프레임으로 바로 보내고, 완성된 답변은 기존처럼 'answer' 로 보낸다.
+        # 같은 토큰을 'debug' 프레임으로 한 번 더 보내지 않도록 stream_handler 는 붙이지 않는다.
+        answer_handler = AnswerStreamingCallbackHandler(self)
+        try:
+            return await apredict_messages(self.llm, messages, callbacks=[answer_handler])
+        finally:
+            await answer_handler.close()
+
     def format_response(self, response: str) -> str:
         """응답 형식을 정리하는 함수"""
-        formatted_response = response.replace("content='", "").replace("' additional_kwargs={} example=False", "").replace("\\n", "\n")
-        formatted_response = formatted_response.replace("**", "")  # Markdown 문법 제거
-        return formatted_response
+        return format_response(response)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from chat.agents.embedding_providers import create_embedding_provider
+from chat.agents.retrieval_engine import RetrievalEngine
+from chat.agents.tokenizer import get_tokenizer
+from chat.utils import CSV_FILE_PATH, load_documents_from_csv
+
+
+class Command(BaseCommand):
+    help = "QA.csv 를 배치로 임베딩해 FAISS 인덱스 산출물을 미리 만듭니다. 중간에 멈추면 다시 실행해 이어서 만듭니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', default=CSV_FILE_PATH, help="임베딩할 QA.csv 경로")
+
+    def handle(self, *args, **options):
+        # 워커가 시작할 때 임베딩하지 않도록 배포 전에 실행한다. 이미 산출물이 있으면 바로 끝난다.
+        documents = load_documents_from_csv(options['csv'])
+        doc_embeddings, index, corpus_key = RetrievalEngine._load_or_create_index(
+            options['csv'], documents, get_tokenizer(), create_embedding_provider()
+        )
+        self.stdout.write(f"Index {corpus_key}: {index.ntotal} documents, dimension {doc_embeddings.shape[1]}")
@@ -0,0 +1,41 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.project import settings
+from chat.agents.ann_index import COMPRESSIONS, INDEX_TYPES, IndexSpec, evaluate_index, normalize
+from chat.agents.retrieval_engine import get_retrieval_engine
+
+
+class Command(BaseCommand):
+    help = "FAISS 인덱스 설정별 recall@k 와 검색 지연 시간을 정확한 flat 검색과 비교합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', default=','.join(INDEX_TYPES), help="비교할 인덱스 종류 (쉼표 구분)")
+        parser.add_argument('--compression', default=','.join(COMPRESSIONS), help="비교할 압축 방식 (쉼표 구분)")
+        parser.add_argument('-k', type=int, default=3, help="recall 을 잴 상위 문서 수")
+        parser.add_argument('--queries', type=int, default=200, help="질의로 쓸 문서 임베딩 수")
+        parser.add_argument('--noise', type=float, default=0.05, help="질의 벡터에 더할 가우시안 잡음 크기")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        kinds = options['types'].split(',')
+        compressions = options['compression'].split(',')
+        unknown = [kind for kind in kinds if kind not in INDEX_TYPES] + [c for c in compressions if c not in COMPRESSIONS]
+        if unknown:
+            raise CommandError(f"Unknown index type or compression: {', '.join(unknown)}")
+
+        # 운영 중인 코퍼스의 문서(제목) 임베딩을 그대로 쓰고, 질의는 그 일부에 잡음을 더해 만든다.
+        vectors = normalize(get_retrieval_engine().doc_embeddings)
+        rng = np.random.default_rng(options['seed'])
+        sample = rng.choice(len(vectors), size=min(options['queries'], len(vectors)), replace=False)
+        queries = vectors[sample] + rng.normal(scale=options['noise'] / np.sqrt(vectors.shape[1]), size=(len(sample), vectors.shape[1]))
+        queries = normalize(queries)
+
+        base = IndexSpec.from_settings(settings)
+        specs = [base._replace(kind=kind, compression=compression) for kind in kinds for compression in compressions]
+        self.stdout.write(f"{len(vectors)} vectors, {len(queries)} queries, k={options['k']}")
+        self.stdout.write(f"{'index':<28}{'recall':>8}{'avg ms':>10}{'p95 ms':>10}{'bytes/vec':>12}")
+        for result in evaluate_index(vectors, queries, specs, k=options['k']):
+            size = f"{result.bytes_per_vector:.0f}" if result.bytes_per_vector else '-'
+            self.stdout.write(f"{result.spec:<28}{result.recall:>8.3f}{result.avg_latency_ms:>10.3f}"
+                              f"{result.p95_latency_ms:>10.3f}{size:>12}")
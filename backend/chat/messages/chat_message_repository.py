@@ -1,23 +1,85 @@
 import os
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 import django
-from channels.db import database_sync_to_async
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.project.settings')
 django.setup()
 
-from chat.models import ChatMessage
+from chat.messages.db_pool import pooled_database_sync_to_async
+from chat.models import Chat, ChatMessage
 
 
 class ChatMessageRepository:
 
-    @database_sync_to_async
+    @pooled_database_sync_to_async
     def get_chat_messages(self, chat_id: str, order_by='timestamp') -> List[ChatMessage]:
         # Retrieve the chat history for `chat_id` from the database
         return list(ChatMessage.objects.filter(chat_id=chat_id).order_by(order_by))
 
-    @database_sync_to_async
+    @pooled_database_sync_to_async
+    def get_recent_chat_messages(self, chat_id: str, limit: int) -> List[ChatMessage]:
+        # Retrieve only the last `limit` messages, oldest first
+        messages = ChatMessage.objects.filter(chat_id=chat_id).order_by('-timestamp', '-id')[:limit]
+        return list(reversed(messages))
+
+    @pooled_database_sync_to_async
+    def get_chat_summary(self, chat_id: str) -> Tuple[str, Optional[int]]:
+        chat = Chat.objects.filter(id=chat_id).values('summary', 'summarized_until').first()
+        if chat is None:
+            return '', None
+        return chat['summary'], chat['summarized_until']
+
+    @pooled_database_sync_to_async
+    def get_unsummarized_messages(self, chat_id: str, keep_last: int, limit: Optional[int] = None) -> List[ChatMessage]:
+        # Messages that fell out of the last `keep_last` window and are not in the summary yet (oldest `limit` of them)
+        chat = Chat.objects.filter(id=chat_id).values('summarized_until').first()
+        if chat is None:
+            return []
+        recent = ChatMessage.objects.filter(chat_id=chat_id).order_by('-timestamp', '-id')
+        boundary = recent.values('timestamp', 'id')[keep_last - 1:keep_last].first()
+        if boundary is None:
+            return []
+        older = ChatMessage.objects.filter(chat_id=chat_id, timestamp__lte=boundary['timestamp']).exclude(
+            timestamp=boundary['timestamp'], id__gte=boundary['id']
+        )
+        if chat['summarized_until'] is not None:
+            older = older.filter(id__gt=chat['summarized_until'])
+        return list(older.order_by('timestamp', 'id')[:limit])
+
+    @pooled_database_sync_to_async
+    def save_chat_summary(self, chat_id: str, summary: str, summarized_until: int):
+        Chat.objects.filter(id=chat_id).update(summary=summary, summarized_until=summarized_until)
+
+    @pooled_database_sync_to_async
     def save_message(self, message: str, sender: str, chat_id: str):
         # Save the message to the database
-        ChatMessage.objects.create(sender=sender, content=message, chat_id=chat_id)
+        with transaction.atomic():
+            ChatMessage.objects.create(sender=sender, content=message, chat_id=chat_id)
+            self._update_chat_stats({chat_id: 1})
+
+    @staticmethod
+    def bulk_create_messages(rows: List[Dict]):
+        # Save several messages in one transaction, keeping their order
+        counts = {}
+        for row in rows:
+            counts[row['chat_id']] = counts.get(row['chat_id'], 0) + 1
+        with transaction.atomic():
+            ChatMessage.objects.bulk_create([ChatMessage(**row) for row in rows])
+            ChatMessageRepository._update_chat_stats(counts)
+
+    @staticmethod
+    def _update_chat_stats(counts: Dict[str, int]):
+        # Keep the denormalized sidebar fields on Chat in step with the messages
+        now = timezone.now()
+        for chat_id, count in counts.items():
+            Chat.objects.filter(id=chat_id).update(
+                message_count=F('message_count') + count, last_message_at=now, updated_at=now
+            )
+
+    @pooled_database_sync_to_async
+    def save_messages(self, rows: List[Dict]):
+        self.bulk_create_messages(rows)
@@ -0,0 +1,104 @@
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from asgiref.sync import SyncToAsync
+from channels.db import database_sync_to_async
+from django.db import connection
+
+from backend.project import settings
+
+
+class DatabaseConnectionPool:
+    """
+    ASGI 쪽 DB 호출을 크기가 고정된 전용 스레드 풀에서 실행한다.
+    기본 연결 설정은 CONN_MAX_AGE=0 이므로, 연결 수명은 Django 대신 이 풀이 스레드별로 관리한다.
+    각 스레드는 max_age 동안 자기 연결을 유지하므로, 연결 폭주 시에도 DB 에는 최대 size 개의 연결만 열린다.
+    연결 상태 확인은 CONN_HEALTH_CHECKS 로 재사용 직전에 이루어진다.
+    """
+
+    def __init__(self, size: int, max_age: int = 600):
+        self.size = size
+        self.max_age = max_age
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='chat-db')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.max_in_use = 0
+        self.calls = 0
+        self.wait_seconds = 0.0
+
+    def _prepare_connection(self):
+        # close_old_connections() 는 CONN_MAX_AGE=0 인 연결을 매번 닫으므로 쓰지 않고, 이 스레드의 연결만 직접 정리한다.
+        if connection.connection is None:
+            return
+        if time.monotonic() - self._local.connected_at >= self.max_age:
+            connection.close()
+        elif connection.errors_occurred and not connection.is_usable():
+            connection.close()
+        else:
+            # 다음 쿼리 직전에 CONN_HEALTH_CHECKS 상태 확인이 한 번 이루어지도록 한다.
+            connection.health_check_done = False
+
+    def _instrumented(self, func, submitted_at: float):
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            with self._lock:
+                self.calls += 1
+                self.wait_seconds += time.monotonic() - submitted_at
+                self.in_use += 1
+                self.max_in_use = max(self.max_in_use, self.in_use)
+            self._prepare_connection()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                # 이번 호출에서 새로 연결했으면 그 시점부터 수명을 잰다.
+                if connection.connection is not getattr(self._local, 'raw_connection', None):
+                    self._local.raw_connection = connection.connection
+                    self._local.connected_at = time.monotonic()
+                with self._lock:
+                    self.in_use -= 1
+        return inner
+
+    async def run(self, func, *args, **kwargs):
+        wrapped = self._instrumented(func, time.monotonic())
+        return await SyncToAsync(wrapped, thread_sensitive=False, executor=self.executor)(*args, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': self.size,
+                'threads': len(self.executor._threads),
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use,
+                'calls': self.calls,
+                'avg_wait_ms': self.wait_seconds / self.calls * 1000 if self.calls else 0.0,
+            }
+
+
+_pool: Optional[DatabaseConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool() -> Optional[DatabaseConnectionPool]:
+    global _pool
+    if _pool is None and settings.DB_POOL_SIZE > 0:
+        with _pool_lock:
+            if _pool is None:
+                _pool = DatabaseConnectionPool(settings.DB_POOL_SIZE, settings.DB_POOL_CONN_MAX_AGE)
+    return _pool
+
+
+def pooled_database_sync_to_async(func):
+    """
+    DB_POOL_SIZE 가 0 보다 크면 전용 연결 풀에서, 아니면 channels 의 database_sync_to_async 로 실행한다.
+    """
+    if settings.DB_POOL_SIZE <= 0:
+        return database_sync_to_async(func)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await get_connection_pool().run(func, *args, **kwargs)
+    return wrapper
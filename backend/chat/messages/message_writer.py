@@ -0,0 +1,199 @@
+import asyncio
+import atexit
+import itertools
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from django.db import DataError, IntegrityError
+
+from backend.project import settings
+from chat.messages.chat_message_repository import ChatMessageRepository
+
+logger = logging.getLogger(__name__)
+
+# 다시 시도해도 같은 행에서 계속 실패하는 오류 (삭제된 채팅을 가리키는 FK, 잘못된 값 등)
+NON_TRANSIENT_ERRORS = (IntegrityError, DataError, ValueError, TypeError)
+
+
+class MessageWriter:
+    """
+    채팅 메시지 저장을 큐에 모아 두었다가 크기/시간 기준으로 bulk_create 한다 (write-behind).
+    답변 전송이 DB 왕복을 기다리지 않고, 부하 시 트랜잭션 수가 크게 줄어든다.
+
+    - 순서: 단일 큐를 앞에서부터 기록하고, 실패한 배치는 맨 앞에 남겨 재시도하므로 채팅별 순서가 유지된다.
+    - 내구성: max_retries 가 0 이면 기록될 때까지 재시도한다 (at-least-once).
+      0 보다 크면 그 횟수만큼 실패한 배치는 버리고 다음 배치로 넘어간다.
+    - 잘못된 행: 배치가 NON_TRANSIENT_ERRORS 로 거부되면 한 행씩 다시 기록하고, 그래도 거부되는 행만
+      dead_letters 로 옮긴다. 행 하나 때문에 뒤의 메시지가 모두 막히지 않는다.
+    """
+
+    DEAD_LETTER_SIZE = 1000
+
+    def __init__(
+        self,
+        repository: ChatMessageRepository = None,
+        write_behind: bool = True,
+        batch_size: int = 50,
+        flush_interval: float = 0.5,
+        max_retries: int = 0,
+    ):
+        self.repository = repository or ChatMessageRepository()
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._pending: Deque[Dict] = deque()
+        self._attempts = 0
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+        self.dead_letters: Deque[Dict] = deque(maxlen=self.DEAD_LETTER_SIZE)
+        self.dead_lettered = 0
+        if write_behind:
+            atexit.register(self.flush_sync)
+
+    def _ensure_task(self):
+        # 이벤트 루프 객체들은 루프 안에서 처음 필요할 때 만든다.
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def has_pending(self, chat_id: str = None) -> bool:
+        if chat_id is None:
+            return bool(self._pending)
+        return any(str(row['chat_id']) == str(chat_id) for row in self._pending)
+
+    async def save_message(self, message: str, sender: str, chat_id: str):
+        if not self.write_behind:
+            await self.repository.save_message(message=message, sender=sender, chat_id=chat_id)
+            return
+        self._pending.append({'content': message, 'sender': sender, 'chat_id': chat_id})
+        self._ensure_task()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        self._ensure_task()
+        async with self._flush_lock:
+            while self._pending:
+                batch = list(itertools.islice(self._pending, self.batch_size))
+                try:
+                    await self.repository.save_messages(batch)
+                except NON_TRANSIENT_ERRORS as e:
+                    self.failures += 1
+                    logger.error(f"Chat message batch of {len(batch)} was rejected ({e}), writing rows one by one")
+                    if not await self._write_rows(len(batch)):
+                        return
+                    continue
+                except Exception as e:
+                    self.failures += 1
+                    self._attempts += 1
+                    logger.error(f"Failed to write {len(batch)} chat messages (attempt {self._attempts}): {e}")
+                    if self.max_retries and self._attempts >= self.max_retries:
+                        self._discard(len(batch))
+                        self.dropped += len(batch)
+                        continue
+                    # 배치를 큐 맨 앞에 남겨 두고 다음 주기에 같은 순서로 다시 시도한다.
+                    return
+                self._discard(len(batch))
+                self.written += len(batch)
+                self.flushes += 1
+
+    async def _write_rows(self, count: int) -> bool:
+        """큐 앞의 count 개 행을 하나씩 기록한다. 일시적인 오류로 멈추면 False 를 반환한다."""
+        for _ in range(count):
+            row = self._pending[0]
+            try:
+                await self.repository.save_messages([row])
+            except NON_TRANSIENT_ERRORS as e:
+                self._dead_letter(row, e)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Failed to write chat message for chat {row['chat_id']}: {e}")
+                return False
+            else:
+                self.written += 1
+            self._discard(1)
+        self.flushes += 1
+        return True
+
+    def _dead_letter(self, row: Dict, error: Exception):
+        self.dead_letters.append(row)
+        self.dead_lettered += 1
+        logger.error(f"Dead-lettered chat message for chat {row['chat_id']} ({row['sender']}): {error}")
+
+    def _discard(self, count: int):
+        for _ in range(count):
+            self._pending.popleft()
+        self._attempts = 0
+
+    def flush_sync(self):
+        # 프로세스 종료 시 이벤트 루프 없이 남은 메시지를 기록한다.
+        while self._pending:
+            batch = list(itertools.islice(self._pending, self.batch_size))
+            try:
+                self.repository.bulk_create_messages(batch)
+            except NON_TRANSIENT_ERRORS:
+                for row in batch:
+                    try:
+                        self.repository.bulk_create_messages([row])
+                        self.written += 1
+                    except NON_TRANSIENT_ERRORS as e:
+                        self._dead_letter(row, e)
+                    except Exception as e:
+                        logger.error(f"Failed to write {len(self._pending)} chat messages on shutdown: {e}")
+                        return
+                    self._discard(1)
+                continue
+            except Exception as e:
+                logger.error(f"Failed to write {len(self._pending)} chat messages on shutdown: {e}")
+                return
+            self._discard(len(batch))
+            self.written += len(batch)
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._pending),
+            'written': self.written,
+            'flushes': self.flushes,
+            'failures': self.failures,
+            'dropped': self.dropped,
+            'dead_lettered': self.dead_lettered,
+        }
+
+
+_writer: Optional[MessageWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_message_writer() -> MessageWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = MessageWriter(
+                    write_behind=settings.MESSAGE_WRITE_BEHIND,
+                    batch_size=settings.MESSAGE_WRITE_BATCH_SIZE,
+                    flush_interval=settings.MESSAGE_WRITE_FLUSH_INTERVAL_MS / 1000,
+                    max_retries=settings.MESSAGE_WRITE_MAX_RETRIES,
+                )
+    return _writer
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_chat_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['chat', 'timestamp', 'id'], name='chat_msg_chat_ts_id_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 10:41
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_message_stats(apps, schema_editor):
+    Chat = apps.get_model('chat', 'Chat')
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    stats = ChatMessage.objects.values('chat_id').annotate(count=Count('id'), last=Max('timestamp'))
+    for row in stats.iterator():
+        Chat.objects.filter(id=row['chat_id']).update(message_count=row['count'], last_message_at=row['last'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_chatmessage_chat_msg_chat_ts_id_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chat',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_message_stats, migrations.RunPython.noop),
+    ]
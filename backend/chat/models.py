@@ -13,7 +13,13 @@ class MessageSender(Enum):
 class Chat(models.Model):
     name = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # 사이드바 표시용 비정규화 필드 (메시지 저장 시 함께 갱신)
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    # 대화 메모리 창 밖으로 밀려난 오래된 메시지들의 누적 요약
+    summary = models.TextField(blank=True, default='')
+    summarized_until = models.BigIntegerField(null=True, blank=True)  # 요약에 반영된 마지막 ChatMessage id
 
 
 class ChatMessage(models.Model):
@@ -22,6 +28,11 @@ class ChatMessage(models.Model):
     sender = models.CharField(max_length=10, choices=[(tag.value, tag.name) for tag in MessageSender])
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # 채팅별 메시지 기록을 (timestamp, id) 키셋으로 페이지네이션하기 위한 복합 인덱스
+            models.Index(fields=['chat', 'timestamp', 'id'], name='chat_msg_chat_ts_id_idx'),
+        ]
 
 
 class Agent(models.Model):
@@ -0,0 +1,40 @@
+import base64
+from datetime import datetime
+from typing import Tuple
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+
+
+def encode_cursor(timestamp: datetime, pk: int) -> str:
+    raw = f"{timestamp.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, pk = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeError):
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+
+
+def before(cursor: str, timestamp_field: str = 'timestamp') -> Q:
+    timestamp, pk = decode_cursor(cursor)
+    return Q(**{f'{timestamp_field}__lt': timestamp}) | Q(**{timestamp_field: timestamp, 'id__lt': pk})
+
+
+def after(cursor: str, timestamp_field: str = 'timestamp') -> Q:
+    timestamp, pk = decode_cursor(cursor)
+    return Q(**{f'{timestamp_field}__gt': timestamp}) | Q(**{timestamp_field: timestamp, 'id__gt': pk})
+
+
+def parse_limit(value, default: int, maximum: int) -> int:
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValidationError({'limit': 'Must be an integer.'})
+    return max(1, min(limit, maximum))
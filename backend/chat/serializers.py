@@ -7,7 +7,8 @@ from .models import Chat, ChatMessage
 class ChatSerializer(serializers.ModelSerializer):
     class Meta:
         model = Chat
-        fields = ['id', 'name', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'created_at', 'updated_at', 'message_count', 'last_message_at']
+        read_only_fields = ['message_count', 'last_message_at']
 
 
 class ChatMessageSerializer(serializers.ModelSerializer):
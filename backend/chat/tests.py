@@ -1,3 +1,630 @@
-from django.test import TestCase
+import asyncio
+import os
+import re
+import tempfile
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.db import IntegrityError, OperationalError
+from django.db.models import Q
+from django.test import SimpleTestCase
+from langchain.schema import SystemMessage
+from rest_framework.exceptions import ValidationError
+
+from chat.agents.ann_index import IndexSpec
+from chat.agents.answer_cache import SemanticAnswerCache
+from chat.agents.building_matcher import BuildingMatcher
+from chat.agents.building_partitions import BuildingPartitions
+from chat.agents.corpus_embedder import CorpusEmbedder
+from chat.agents.buildings import KOREA_UNIVERSITY_BUILDINGS
+from chat.agents.embedding_providers import FakeEmbeddingProvider
+from chat.agents.index_store import IndexStore
+from chat.agents.lexical_index import BM25Index, is_decisive, reciprocal_rank_fusion
+from chat.agents.memory import BoundedConversationMemory, summary_batch
+from chat.agents.prompt_builder import PromptBuilder
+from chat.agents.response_formatter import IncrementalResponseFormatter, format_response
+from chat.agents.retrieval_engine import RetrievalEngine
+from chat.agents.single_flight import SingleFlight
+from chat.consumers import ChatConsumer
+from chat.messages.message_writer import MessageWriter
+from chat.models import ChatMessage, MessageSender
+from chat.pagination import after, before, decode_cursor, encode_cursor, parse_limit
+
+
+class WhitespaceTokenizer:
+    """Mecab 없이 공백으로만 나누는 테스트용 토크나이저"""
+
+    identifier = 'whitespace'
+
+    def nouns(self, text):
+        return text.split()
+
+    def morphs(self, text):
+        return text.split()
+
+    def batch_morphs(self, texts):
+        return [self.morphs(text) for text in texts]
+
+
+class IndexStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.root_dir.name, 'QA.csv')
+        with open(self.csv_path, 'w', encoding='utf-8') as file:
+            file.write("title,content\n")
+        self.documents = [{'title': '중앙도서관 열람실'}, {'title': '공학관 주차'}, {'title': '중앙도서관 열람실'}]
+        self.provider = FakeEmbeddingProvider()
+        self.embedded = []
+
+    def tearDown(self):
+        self.root_dir.cleanup()
+
+    def embed(self, texts, checkpoint_dir):
+        self.embedded.append(list(texts))
+        return self.provider.embed_documents(texts)
+
+    def store(self, **kwargs):
+        return IndexStore(self.root_dir.name, self.csv_path, 'whitespace', self.provider.model,
+                          provider=self.provider.name, **kwargs)
+
+    def load_or_build(self, store):
+        return store.load_or_build(self.documents, tokenize_batch=lambda titles: list(titles),
+                                   embed_documents=self.embed)
+
+    def test_round_trip_loads_saved_artifacts_without_embedding(self):
+        built_embeddings, built_index = self.load_or_build(self.store())
+        loaded_embeddings, loaded_index = self.load_or_build(self.store())
+
+        # 같은 제목은 한 번만 임베딩하고, 두 번째 호출은 디스크에서 읽는다.
+        self.assertEqual(self.embedded, [['공학관 주차', '중앙도서관 열람실']])
+        self.assertEqual(loaded_embeddings.shape, (3, self.provider.dimension))
+        np.testing.assert_allclose(loaded_embeddings, built_embeddings)
+        np.testing.assert_allclose(loaded_embeddings[0], loaded_embeddings[2])
+        self.assertEqual(loaded_index.ntotal, built_index.ntotal)
+
+        _, positions = loaded_index.search(loaded_embeddings[1:2], 1)
+        self.assertEqual(positions[0][0], 1)
+
+    def test_changed_corpus_is_rebuilt(self):
+        self.load_or_build(self.store())
+        with open(self.csv_path, 'a', encoding='utf-8') as file:
+            file.write("새 제목,새 내용\n")
+        self.documents.append({'title': '새 제목'})
+        embeddings, index = self.load_or_build(self.store())
+
+        # 바뀐 제목만 새로 임베딩한다.
+        self.assertEqual(self.embedded[1:], [['새 제목']])
+        self.assertEqual(index.ntotal, 4)
+        self.assertEqual(embeddings.shape[0], 4)
+
+    def test_index_spec_change_reuses_embeddings(self):
+        self.load_or_build(self.store())
+        _, index = self.load_or_build(self.store(index_spec=IndexSpec(compression='fp16')))
+
+        # 인덱스 설정만 바뀌면 저장된 임베딩으로 인덱스만 다시 만든다.
+        self.assertEqual(len(self.embedded), 1)
+        self.assertEqual(index.ntotal, 3)
+
+
+class BuildingMatcherTests(SimpleTestCase):
+
+    def setUp(self):
+        self.matcher = BuildingMatcher(
+            ["중앙도서관(중도)", "해송법학도서관(해도/법도)", "중앙광장지하(중지)", "경영본관", "본관"],
+            WhitespaceTokenizer(),
+        )
+
+    def test_full_name(self):
+        match = self.matcher.match_exact("중앙도서관 몇 시까지 열어?")
+        self.assertEqual(match.canonical_name, "중앙도서관")
+        self.assertFalse(match.alias_hit)
+        self.assertEqual(match.score, 100.0)
+
+    def test_longest_full_name_wins(self):
+        self.assertEqual(self.matcher.match_exact("경영 본관 위치").canonical_name, "경영본관")
+
+    def test_alias_as_noun(self):
+        match = self.matcher.match_exact("해도 어디야")
+        self.assertEqual(match.canonical_name, "해송법학도서관")
+        self.assertTrue(match.alias_hit)
+
+    def test_alias_inside_word_is_ignored(self):
+        self.assertIsNone(self.matcher.match_exact("여기서 공부해도 돼?"))
+
+    def test_alias_followed_by_verb_suffix_is_ignored(self):
+        self.assertIsNone(self.matcher.match_exact("공사를 중지하다"))
+
+    def test_alias_to_full_name(self):
+        self.assertEqual(self.matcher.alias_to_full_name["중도"], "중앙도서관")
+
+
+class BuildingListTests(SimpleTestCase):
+    """실제 건물 목록이 매처가 기대하는 "이름(별칭/별칭)" 형식인지 확인한다."""
+
+    def test_each_entry_has_at_most_one_alias_group(self):
+        # 쉼표가 빠져 두 문자열이 이어 붙으면 괄호 묶음이 두 개가 된다.
+        for building in KOREA_UNIVERSITY_BUILDINGS:
+            with self.subTest(building=building):
+                self.assertLessEqual(len(re.findall(r'\(([^)]+)\)', building)), 1)
+
+    def test_every_building_matches_itself(self):
+        matcher = BuildingMatcher(KOREA_UNIVERSITY_BUILDINGS, WhitespaceTokenizer())
+        for building in KOREA_UNIVERSITY_BUILDINGS:
+            main_name = re.split('[()]', building)[0].strip()
+            with self.subTest(building=building):
+                self.assertEqual(matcher.match_exact(main_name).canonical_name, main_name)
+
+    def test_frontier_hall_is_its_own_building(self):
+        matcher = BuildingMatcher(KOREA_UNIVERSITY_BUILDINGS, WhitespaceTokenizer())
+        self.assertEqual(matcher.match_exact("프런티어관 위치").canonical_name, "프런티어관")
+        self.assertEqual(matcher.match_exact("민주광장 위치").canonical_name, "민주광장")
+
+
+class IncrementalResponseFormatterTests(SimpleTestCase):
+
+    def test_tokens_split_inside_markup(self):
+        formatter = IncrementalResponseFormatter()
+        streamed = "".join(formatter.feed(token) for token in ["**굵", "게*", "* 끝\\", "n다음"]) + formatter.finish()
+        self.assertEqual(streamed, format_response("**굵게** 끝\\n다음"))
+        self.assertEqual(streamed, "굵게 끝\n다음")
+
+    def test_finish_flushes_held_characters(self):
+        formatter = IncrementalResponseFormatter()
+        self.assertEqual(formatter.feed("별표*"), "별표")
+        self.assertEqual(formatter.finish(), "*")
+
+
+class BoundedConversationMemoryTests(SimpleTestCase):
+
+    def memory(self, **kwargs):
+        memory = BoundedConversationMemory(memory_key="chat_history", return_messages=True, token_counter=len, **kwargs)
+        for i in range(6):
+            memory.chat_memory.add_user_message(f"질문{i}")
+            memory.chat_memory.add_ai_message(f"답변{i}")
+        return memory
+
+    def test_trim_keeps_the_last_max_messages(self):
+        memory = self.memory(max_messages=4)
+        memory.trim()
+        self.assertEqual([m.content for m in memory.chat_memory.messages], ["질문4", "답변4", "질문5", "답변5"])
+
+    def test_buffer_respects_token_budget_and_prepends_summary(self):
+        # 메시지 하나가 3 토큰(글자)이므로 7 토큰 한도에는 최근 두 개만 들어간다.
+        memory = self.memory(max_messages=10, max_tokens=7)
+        memory.summary = "이전 요약"
+        buffer = memory.buffer
+        self.assertIsInstance(buffer[0], SystemMessage)
+        self.assertIn("이전 요약", buffer[0].content)
+        self.assertEqual([m.content for m in buffer[1:]], ["질문5", "답변5"])
+
+    def test_buffer_keeps_latest_message_over_budget(self):
+        memory = self.memory(max_messages=10, max_tokens=1)
+        self.assertEqual([m.content for m in memory.buffer], ["답변5"])
+
+
+class SummaryBatchTests(SimpleTestCase):
+
+    def messages(self, *contents):
+        return [ChatMessage(id=i, content=content, sender=MessageSender.USER.value) for i, content in enumerate(contents)]
+
+    def test_takes_oldest_messages_within_budget(self):
+        batch = summary_batch(self.messages("가나다", "라마바", "사아자"), max_tokens=6, token_counter=len)
+        self.assertEqual([m.content for m in batch], ["가나다", "라마바"])
+
+    def test_always_takes_at_least_one_message(self):
+        batch = summary_batch(self.messages("아주 긴 메시지", "짧음"), max_tokens=2, token_counter=len)
+        self.assertEqual([m.content for m in batch], ["아주 긴 메시지"])
+
+
+class FakeMessageRepository:
+    """rejected 내용의 행은 FK 오류로 거부하고, 처음 transient_failures 번은 연결 오류를 내는 저장소"""
+
+    def __init__(self, rejected=(), transient_failures=0):
+        self.rows = []
+        self.rejected = set(rejected)
+        self.transient_failures = transient_failures
+
+    def bulk_create_messages(self, rows):
+        if self.transient_failures:
+            self.transient_failures -= 1
+            raise OperationalError("connection lost")
+        if any(row['content'] in self.rejected for row in rows):
+            raise IntegrityError("chat does not exist")
+        self.rows.extend(rows)
+
+    async def save_messages(self, rows):
+        self.bulk_create_messages(rows)
+
+
+class MessageWriterTests(SimpleTestCase):
+
+    def writer(self, repository, **kwargs):
+        # 백그라운드 flush 주기가 테스트 중에 돌지 않도록 길게 잡고, 직접 flush 한다.
+        return MessageWriter(repository=repository, flush_interval=60, **kwargs)
+
+    def run_writer(self, writer, scenario):
+        async def main():
+            try:
+                await scenario()
+            finally:
+                if writer._task is not None:
+                    writer._task.cancel()
+        asyncio.run(main())
+
+    async def queue(self, writer, *contents):
+        for content in contents:
+            await writer.save_message(message=content, sender=MessageSender.USER.value, chat_id='1')
+
+    def contents(self, rows):
+        return [row['content'] for row in rows]
+
+    def test_transient_failure_keeps_batch_in_order(self):
+        repository = FakeMessageRepository(transient_failures=1)
+        writer = self.writer(repository)
+
+        async def scenario():
+            await self.queue(writer, "a", "b")
+            await writer.flush()
+            self.assertEqual(repository.rows, [])
+            self.assertTrue(writer.has_pending('1'))
+
+            await self.queue(writer, "c")
+            await writer.flush()
+
+        self.run_writer(writer, scenario)
+        self.assertEqual(self.contents(repository.rows), ["a", "b", "c"])
+        self.assertEqual(writer.stats()['pending'], 0)
+
+    def test_rejected_row_is_dead_lettered_and_the_rest_written_in_order(self):
+        repository = FakeMessageRepository(rejected={"bad"})
+        writer = self.writer(repository)
+
+        async def scenario():
+            await self.queue(writer, "a", "bad", "c")
+            await writer.flush()
+
+        self.run_writer(writer, scenario)
+        self.assertEqual(self.contents(repository.rows), ["a", "c"])
+        self.assertEqual(self.contents(writer.dead_letters), ["bad"])
+        self.assertEqual(writer.stats()['dead_lettered'], 1)
+        self.assertEqual(writer.stats()['written'], 2)
+        self.assertFalse(writer.has_pending())
+
+    def test_max_retries_drops_the_failing_batch(self):
+        repository = FakeMessageRepository(transient_failures=2)
+        writer = self.writer(repository, max_retries=2)
+
+        async def scenario():
+            await self.queue(writer, "a")
+            await writer.flush()
+            await writer.flush()
+            await self.queue(writer, "b")
+            await writer.flush()
+
+        self.run_writer(writer, scenario)
+        self.assertEqual(self.contents(repository.rows), ["b"])
+        self.assertEqual(writer.stats()['dropped'], 1)
+
+    def test_flush_sync_dead_letters_rejected_rows(self):
+        repository = FakeMessageRepository(rejected={"bad"})
+        writer = self.writer(repository)
+
+        async def scenario():
+            await self.queue(writer, "bad", "b")
+
+        self.run_writer(writer, scenario)
+        writer.flush_sync()
+        self.assertEqual(self.contents(repository.rows), ["b"])
+        self.assertEqual(self.contents(writer.dead_letters), ["bad"])
+
+
+class PaginationTests(SimpleTestCase):
+
+    def test_cursor_round_trip(self):
+        timestamp = datetime(2024, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor(timestamp, 42)), (timestamp, 42))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValidationError):
+            decode_cursor("not-a-cursor")
+
+    def test_before_and_after_break_timestamp_ties_by_id(self):
+        timestamp = datetime(2024, 3, 1, tzinfo=timezone.utc)
+        cursor = encode_cursor(timestamp, 7)
+        self.assertEqual(str(before(cursor)), str(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=7)))
+        self.assertEqual(str(after(cursor)), str(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=7)))
+
+    def test_parse_limit(self):
+        self.assertEqual(parse_limit(None, default=20, maximum=100), 20)
+        self.assertEqual(parse_limit('500', default=20, maximum=100), 100)
+        self.assertEqual(parse_limit('0', default=20, maximum=100), 1)
+        with self.assertRaises(ValidationError):
+            parse_limit('many', default=20, maximum=100)
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = SemanticAnswerCache('corpus-1', threshold=0.95, max_size=2)
+        self.vector = np.array([1.0, 0.0, 0.0], dtype='float32')
+
+    def test_similar_question_for_same_building_hits(self):
+        self.cache.store('중앙도서관', self.vector, '9시에 엽니다', ['문서'])
+        cached = self.cache.lookup('중앙도서관', np.array([0.99, 0.05, 0.0], dtype='float32'))
+        self.assertEqual(cached.answer, '9시에 엽니다')
+        self.assertEqual(cached.retrieved_docs, ['문서'])
+        self.assertGreaterEqual(cached.similarity, 0.95)
+
+    def test_other_building_or_dissimilar_question_misses(self):
+        self.cache.store('중앙도서관', self.vector, '9시에 엽니다', [])
+        self.assertIsNone(self.cache.lookup('공학관', self.vector))
+        self.assertIsNone(self.cache.lookup('중앙도서관', np.array([0.0, 1.0, 0.0], dtype='float32')))
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_oldest_entry_is_evicted(self):
+        for i, building in enumerate(['a', 'b', 'c']):
+            self.cache.store(building, self.vector, f'답변{i}', [])
+        self.assertIsNone(self.cache.lookup('a', self.vector))
+        self.assertEqual(self.cache.lookup('c', self.vector).answer, '답변2')
+        self.assertEqual(self.cache.stats()['size'], 2)
+
+    def test_expired_entry_misses(self):
+        cache = SemanticAnswerCache('corpus-1', ttl=-1)
+        cache.store('중앙도서관', self.vector, '오래된 답변', [])
+        self.assertIsNone(cache.lookup('중앙도서관', self.vector))
+
+    def test_corpus_change_clears_entries(self):
+        self.cache.store('중앙도서관', self.vector, '9시에 엽니다', [])
+        self.cache.invalidate('corpus-2')
+        self.assertIsNone(self.cache.lookup('중앙도서관', self.vector))
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        self.single_flight = SingleFlight()
+        self.calls = 0
+
+    async def compute(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {'response': f'답변{self.calls}'}
+
+    def test_concurrent_calls_share_one_computation(self):
+        async def scenario():
+            return await asyncio.gather(*[self.single_flight.do('key', self.compute) for _ in range(3)])
+
+        results = asyncio.run(scenario())
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{'response': '답변1'}] * 3)
+        self.assertEqual(self.single_flight.stats(), {'in_flight': 0, 'leaders': 1, 'shared': 2, 'remote_shared': 0})
+
+    def test_different_keys_and_later_calls_compute_again(self):
+        async def scenario():
+            await asyncio.gather(self.single_flight.do('a', self.compute), self.single_flight.do('b', self.compute))
+            return await self.single_flight.do('a', self.compute)
+
+        self.assertEqual(asyncio.run(scenario()), {'response': '답변3'})
+        self.assertEqual(self.calls, 3)
+
+    def test_error_reaches_every_waiter(self):
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("llm failed")
+
+        async def scenario():
+            return await asyncio.gather(*[self.single_flight.do('key', fail) for _ in range(2)], return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(self.single_flight.stats()['in_flight'], 0)
+
+    def test_cancelled_leader_does_not_cancel_the_computation(self):
+        async def scenario():
+            leader = asyncio.ensure_future(self.single_flight.do('key', self.compute))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(self.single_flight.do('key', self.compute))
+            leader.cancel()
+            return await follower
+
+        self.assertEqual(asyncio.run(scenario()), {'response': '답변1'})
+        self.assertEqual(self.calls, 1)
+
+
+class CharacterEncoding:
+    """글자 하나(문서 구분자 빈 줄은 통째로)를 토큰 하나로 세는 tiktoken 대용 인코딩"""
+
+    def encode(self, text):
+        return re.findall(r'\n\n|.', text, re.S)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+class PromptBuilderTests(SimpleTestCase):
+
+    def builder(self, **kwargs):
+        with mock.patch('chat.agents.prompt_builder.tiktoken.encoding_for_model', return_value=CharacterEncoding()):
+            return PromptBuilder("시스템", "test-model", **kwargs)
+
+    def test_system_message_is_a_stable_prefix(self):
+        builder = self.builder()
+        first = builder.build("질문 하나", ["문서"])
+        second = builder.build("다른 질문", ["다른 문서"])
+        self.assertEqual(first.messages[0].content, "시스템")
+        self.assertEqual(first.messages[0], second.messages[0])
+        self.assertTrue(first.messages[1].content.endswith("질문 하나"))
+
+    def test_duplicate_and_contained_passages_are_included_once(self):
+        prompt = self.builder().build("질문", ["중앙도서관  운영 시간", "중앙도서관 운영 시간", "운영", "공학관"])
+        self.assertEqual(prompt.passages, ["중앙도서관  운영 시간", "공학관"])
+
+    def test_passages_fit_the_token_budget(self):
+        # 시스템 6, 질문 2, 구분 토큰 6 을 빼면 문서에 26 토큰이 남는다.
+        builder = self.builder(max_prompt_tokens=40, max_passage_tokens=10)
+        prompt = builder.build("질문", ["가" * 15, "나" * 15, "다" * 15, "라" * 15])
+
+        self.assertEqual([len(passage) for passage in prompt.passages], [10, 10, 3])
+        self.assertLessEqual(prompt.prompt_tokens, 40)
+        self.assertEqual(builder.stats()['truncated_passages'], 3)
+        self.assertEqual(builder.stats()['dropped_passages'], 1)
+
+
+class HistoryLoadingAgentFactory:
+    """create_agent 시점에 저장소에 기록된 메시지를 에이전트 메모리로 잡아 두는 AgentFactory 대용"""
+
+    def __init__(self, repository):
+        self.repository = repository
+        self.history = None
+
+    async def create_agent(self, chat_id=None):
+        self.history = [row['content'] for row in self.repository.rows]
+        return object()
+
+
+class ChatConsumerHistoryTests(SimpleTestCase):
+
+    def test_current_message_is_not_loaded_into_first_turn_history(self):
+        repository = FakeMessageRepository()
+        writer = MessageWriter(repository=repository, flush_interval=60)
+        consumer = ChatConsumer.__new__(ChatConsumer)
+        consumer.chat_id = '1'
+        consumer.agent = None
+        consumer.http_pool_installed = True
+        consumer.message_writer = writer
+        consumer.agent_factory = HistoryLoadingAgentFactory(repository)
+
+        async def run_agent_async(message, message_id):
+            return {"response": "답변", "retrieved_docs": []}
+        consumer.run_agent_async = run_agent_async
+
+        async def main():
+            try:
+                # 이전 연결에서 아직 기록되지 않은 메시지는 기록에 들어가야 한다.
+                await writer.save_message(message="이전 질문", sender=MessageSender.USER.value, chat_id='1')
+                with mock.patch('chat.consumers.get_agent_template'):
+                    await consumer.message_agent("새 질문", '1', 'message-1')
+                await writer.flush()
+            finally:
+                if writer._task is not None:
+                    writer._task.cancel()
+        asyncio.run(main())
+
+        self.assertEqual(consumer.agent_factory.history, ["이전 질문"])
+        self.assertEqual([row['content'] for row in repository.rows], ["이전 질문", "새 질문", "답변"])
+
+
+class BuildingPartitionsTests(SimpleTestCase):
+
+    def setUp(self):
+        # 문서 0, 1 은 중앙도서관, 2 는 공학관, 3 은 건물 태그가 없는 공통 문서
+        self.doc_embeddings = np.eye(4, dtype='float32')
+        self.partitions = BuildingPartitions(self.doc_embeddings, ["중앙도서관", "중앙도서관", "공학관", None])
+
+    def test_untagged_documents_are_searched_with_the_partition(self):
+        self.assertEqual(self.partitions.search("중앙도서관", self.doc_embeddings[3], k=1), [3])
+        self.assertEqual(sorted(self.partitions.search("중앙도서관", self.doc_embeddings[3], k=10)), [0, 1, 3])
+
+    def test_other_buildings_are_excluded(self):
+        self.assertNotIn(2, self.partitions.search("중앙도서관", self.doc_embeddings[2], k=10))
+        self.assertEqual(self.partitions.doc_ids("공학관").tolist(), [2, 3])
+
+    def test_unknown_building_uses_global_index(self):
+        self.assertIsNone(self.partitions.search("본관", self.doc_embeddings[0], k=3))
+        self.assertIsNone(self.partitions.doc_ids(None))
+        self.assertEqual(self.partitions.stats()['untagged_documents'], 1)
+
+
+class DocumentTaggingTests(SimpleTestCase):
+
+    def tag(self, title, content=""):
+        engine = SimpleNamespace(building_matcher=BuildingMatcher(["중앙도서관(중도)", "공학관"], WhitespaceTokenizer()))
+        return next(RetrievalEngine._tag_documents(engine, [{'title': title, 'content': content}]))['building']
+
+    def test_name_or_alias_tags_the_document(self):
+        self.assertEqual(self.tag("중앙도서관 열람실"), "중앙도서관")
+        self.assertEqual(self.tag("운영 시간", "중도 는 24시간 연다"), "중앙도서관")
+
+    def test_near_miss_is_left_untagged(self):
+        self.assertIsNone(self.tag("중앙 도서 이용 안내"))
+        self.assertIsNone(self.tag("학생 식당 메뉴"))
+
+
+class LexicalIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.index = BM25Index([['중앙', '도서관', '열람실'], ['공학관', '주차'], ['도서관', '운영', '시간']])
+
+    def test_documents_matching_more_terms_rank_first(self):
+        self.assertEqual([doc_id for doc_id, _ in self.index.search(['열람실', '도서관'], k=3)], [0, 2])
+
+    def test_search_within_doc_ids(self):
+        hits = self.index.search(['열람실', '도서관'], k=3, doc_ids=np.array([1, 2]))
+        self.assertEqual([doc_id for doc_id, _ in hits], [2])
+
+    def test_no_matching_terms(self):
+        self.assertEqual(self.index.search(['체육관'], k=3), [])
+
+    def test_reciprocal_rank_fusion(self):
+        self.assertEqual(reciprocal_rank_fusion([[1, 2, 3], [3, 1]]), [1, 3, 2])
+
+    def test_is_decisive(self):
+        self.assertTrue(is_decisive([(0, 5.0)], min_score=2.0, margin=1.5))
+        self.assertTrue(is_decisive([(0, 6.0), (1, 3.0)], min_score=2.0, margin=1.5))
+        self.assertFalse(is_decisive([(0, 4.0), (1, 3.0)], min_score=2.0, margin=1.5))
+        self.assertFalse(is_decisive([(0, 1.0)], min_score=2.0, margin=1.5))
+        self.assertFalse(is_decisive([], min_score=2.0, margin=1.5))
+
+
+class RecordingEmbeddingProvider(FakeEmbeddingProvider):
+    """임베딩한 배치를 기록하고, fail_on 이 든 배치는 오류를 내는 임베딩 제공자"""
+
+    def __init__(self, fail_on=None):
+        super().__init__(dimension=8)
+        self.fail_on = fail_on
+        self.batches = []
+
+    def embed_documents(self, texts):
+        if self.fail_on in texts:
+            raise RuntimeError("embedding request failed")
+        self.batches.append(list(texts))
+        return super().embed_documents(texts)
+
+
+class CorpusEmbedderTests(SimpleTestCase):
+
+    TEXTS = ["a", "b", "c", "d", "e", "f"]
+
+    def setUp(self):
+        self.checkpoint_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.checkpoint_dir.cleanup()
+
+    def embed(self, provider, batch_size=2):
+        embedder = CorpusEmbedder(provider, batch_size=batch_size, max_concurrency=1, max_retries=0)
+        return embedder.embed(self.TEXTS, self.checkpoint_dir.name)
+
+    def interrupt(self):
+        # 세 번째 배치에서 멈춘 빌드: 앞의 두 배치만 체크포인트에 남는다.
+        with self.assertRaises(RuntimeError):
+            self.embed(RecordingEmbeddingProvider(fail_on="e"))
+
+    def test_resume_embeds_only_missing_batches(self):
+        self.interrupt()
+        provider = RecordingEmbeddingProvider()
+        embeddings = self.embed(provider)
+
+        self.assertEqual(provider.batches, [["e", "f"]])
+        np.testing.assert_allclose(embeddings, provider.embed_documents(self.TEXTS), rtol=1e-6)
+
+    def test_batch_size_change_discards_checkpoint(self):
+        self.interrupt()
+        provider = RecordingEmbeddingProvider()
+        embeddings = self.embed(provider, batch_size=3)
+
+        self.assertEqual(provider.batches, [["a", "b", "c"], ["d", "e", "f"]])
+        np.testing.assert_allclose(embeddings, provider.embed_documents(self.TEXTS), rtol=1e-6)
@@ -20,7 +20,9 @@ def load_documents_from_csv(file_path):
             for row in reader:
                 documents.append({
                     'title': row['title'],
-                    'content': row['content']
+                    'content': row['content'],
+                    # 선택 컬럼: 비어 있으면 검색 엔진이 제목/내용에서 건물을 찾아 붙인다.
+                    'building': row.get('building') or None,
                 })
         logger.debug(f"Loaded {len(documents)} documents")
     except Exception as e:
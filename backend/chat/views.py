@@ -1,12 +1,41 @@
+import hashlib
+
+from django.db.models import Count, Max
 from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from .agents.retrieval_engine import get_retrieval_engine, is_ready
+from .agents.http_pool import get_openai_http_pool
+from .agents.router import get_query_router
+from .agents.single_flight import get_single_flight
+from .messages.db_pool import get_connection_pool
+from .messages.message_writer import get_message_writer
+from . import pagination
 from .models import Agent
 from .models import Chat, ChatMessage
 from .serializers import AgentSerializer
-from .serializers import ChatSerializer, ChatMessageSerializer
+from .serializers import ChatSerializer
+
+
+def _chat_list_state(request):
+    # ETag 와 Last-Modified 계산에 같은 집계 결과를 쓰도록 요청에 한 번만 저장한다.
+    if not hasattr(request, '_chat_list_state'):
+        request._chat_list_state = Chat.objects.aggregate(last_updated=Max('updated_at'), count=Count('id'))
+    return request._chat_list_state
+
+
+def _chat_list_etag(request, *args, **kwargs):
+    state = _chat_list_state(request)
+    raw = f"{state['count']}:{state['last_updated']}:{request.GET.urlencode()}"
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _chat_list_last_modified(request, *args, **kwargs):
+    return _chat_list_state(request)['last_updated']
 
 
 class ChatViewSet(viewsets.ModelViewSet):
@@ -24,17 +53,71 @@ class ChatViewSet(viewsets.ModelViewSet):
         ChatMessage.objects.filter(chat_id=instance.id).delete()
         instance.delete()
 
+    @method_decorator(condition(etag_func=_chat_list_etag, last_modified_func=_chat_list_last_modified))
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        return JsonResponse({"chats": serializer.data})
+        """
+        최근에 갱신된 채팅부터 반환한다. limit 이 있으면 (updated_at, id) 키셋 페이지로 나누고
+        다음 페이지는 before=next_cursor 로 요청한다. 목록이 바뀌지 않았으면 조건부 GET 에 304 를 보낸다.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).order_by('-updated_at', '-id')
+        params = request.query_params
+        if 'limit' not in params and 'before' not in params:
+            serializer = self.get_serializer(queryset, many=True)
+            return JsonResponse({"chats": serializer.data})
+
+        limit = pagination.parse_limit(params.get('limit'), default=50, maximum=200)
+        if 'before' in params:
+            queryset = queryset.filter(pagination.before(params['before'], timestamp_field='updated_at'))
+        chats = list(queryset[:limit + 1])
+        next_cursor = None
+        if len(chats) > limit:
+            chats = chats[:limit]
+            next_cursor = pagination.encode_cursor(chats[-1].updated_at, chats[-1].id)
+        serializer = self.get_serializer(chats, many=True)
+        return JsonResponse({"chats": serializer.data, "next_cursor": next_cursor})
 
     @action(detail=True, methods=['get'])
     def messages(self, request, pk=None):
+        """
+        파라미터가 없으면 기존처럼 전체 기록을 배열로 반환한다.
+        limit/before/since 중 하나라도 있으면 (timestamp, id) 키셋 페이지를 반환한다.
+        - before=<cursor>: 커서보다 오래된 메시지 중 최근 limit 개 (이전 기록 불러오기)
+        - since=<cursor>: 커서 이후의 새 메시지 limit 개
+        """
         chat = self.get_object()
-        messages = ChatMessage.objects.filter(chat_id=chat.id).order_by('timestamp')
-        serializer = ChatMessageSerializer(messages, many=True)
-        return Response(serializer.data)
+        messages = ChatMessage.objects.filter(chat_id=chat.id)
+        params = request.query_params
+        if not any(key in params for key in ('limit', 'before', 'since')):
+            return Response(self._message_rows(messages.order_by('timestamp', 'id')))
+
+        limit = pagination.parse_limit(params.get('limit'), default=50, maximum=200)
+        if 'since' in params:
+            rows = self._message_rows(messages.filter(pagination.after(params['since'])).order_by('timestamp', 'id')[:limit + 1])
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            if 'before' in params:
+                messages = messages.filter(pagination.before(params['before']))
+            rows = self._message_rows(messages.order_by('-timestamp', '-id')[:limit + 1])
+            has_more = len(rows) > limit
+            rows = list(reversed(rows[:limit]))
+
+        first, last = (rows[0], rows[-1]) if rows else (None, None)
+        return Response({
+            'results': rows,
+            'has_more': has_more,
+            # 더 오래된 페이지는 before=previous_cursor, 새 메시지는 since=latest_cursor 로 요청한다.
+            'previous_cursor': pagination.encode_cursor(first['timestamp'], first['id']) if first else None,
+            'latest_cursor': pagination.encode_cursor(last['timestamp'], last['id']) if last else params.get('since'),
+        })
+
+    @staticmethod
+    def _message_rows(queryset):
+        # 모델 인스턴스/시리얼라이저 없이 values() 로 바로 직렬화한다. 필드 구성은 ChatMessageSerializer 와 같다.
+        return [
+            {'id': row['id'], 'content': row['content'], 'chat': row['chat_id'], 'sender': row['sender'], 'timestamp': row['timestamp']}
+            for row in queryset.values('id', 'content', 'chat_id', 'sender', 'timestamp')
+        ]
 
 
 class AgentViewSet(viewsets.ModelViewSet):
@@ -53,3 +136,24 @@ class AgentViewSet(viewsets.ModelViewSet):
         agent.agent_type = request.data.get('agent_type')
         agent.save()
         return Response(AgentSerializer(agent).data)
+
+
+def readiness(request):
+    # 검색 엔진 예열이 끝난 뒤에만 트래픽을 받을 준비가 된 것으로 보고한다.
+    ready = is_ready()
+    return JsonResponse({"ready": ready}, status=200 if ready else 503)
+
+
+def metrics(request):
+    # 캐시 적중률 등 검색 엔진 내부 카운터를 확인하기 위한 엔드포인트
+    if not is_ready():
+        return JsonResponse({"ready": False}, status=503)
+    stats = get_retrieval_engine().stats()
+    stats['message_writer'] = get_message_writer().stats()
+    stats['routes'] = get_query_router().stats()
+    stats['single_flight'] = get_single_flight().stats()
+    stats['openai_http'] = get_openai_http_pool().stats()
+    pool = get_connection_pool()
+    if pool is not None:
+        stats['db_pool'] = pool.stats()
+    return JsonResponse(stats)
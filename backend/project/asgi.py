@@ -3,6 +3,10 @@ from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 import backend.chat.websocket_urls
+from backend.chat.agents.agent_factory import get_agent_template
+from backend.project import settings
+from chat.agents.http_pool import get_openai_http_pool
+from chat.agents.retrieval_engine import warm_up
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.project.settings')
 
@@ -14,3 +18,11 @@ application = ProtocolTypeRouter({
         )
     ),
 })
+
+# 검색 엔진(문서, 임베딩, 인덱스)은 워커 프로세스가 요청을 받기 전에 한 번만 준비한다.
+# 문서 임베딩 같은 동기 OpenAI 호출도 공용 연결 풀을 쓰도록 먼저 만든다.
+get_openai_http_pool()
+if settings.RETRIEVAL_WARM_UP_ON_STARTUP:
+    warm_up()
+    # 도구와 에이전트 프롬프트도 프로세스당 한 번만 만든다.
+    get_agent_template()
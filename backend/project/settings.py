@@ -46,11 +46,13 @@ INSTALLED_APPS = [
 ]
 
 # Django Channels
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379')
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            'hosts': [os.environ.get('REDIS_URL', 'redis://localhost:6379')]
+            'hosts': [REDIS_URL]
         },
     },
 }
@@ -146,10 +148,17 @@ WSGI_APPLICATION = 'backend.project.wsgi.application'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 import dj_database_url
 
+# ASGI 에서는 요청마다 새 스레드 컨텍스트에서 연결이 열리므로 기본 연결은 요청이 끝나면 닫는다(CONN_MAX_AGE=0).
+# 연결 재사용은 아래 전용 DB 풀 스레드에서만 한다. 재사용 직전에 상태를 확인한다(CONN_HEALTH_CHECKS).
 DATABASES = {
-    'default': dj_database_url.config()
+    'default': dj_database_url.config(conn_max_age=0, conn_health_checks=True)
 }
 
+# 웹소켓 consumer 의 DB 호출을 실행할 전용 스레드(=연결) 수. 0 이면 channels 기본 동작을 사용
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+# 전용 DB 풀 스레드가 자기 연결을 유지하는 시간(초)
+DB_POOL_CONN_MAX_AGE = int(os.environ.get('DB_POOL_CONN_MAX_AGE', 600))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -191,3 +200,101 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Access the OPENAI_API_KEY environment variable
 openai_api_key = os.environ.get('OPENAI_API_KEY')
+
+# 답변 생성에 쓰는 OpenAI 채팅 모델
+OPENAI_CHAT_MODEL = os.environ.get('OPENAI_CHAT_MODEL', 'gpt-4o-mini-2024-07-18')
+
+# Retrieval engine
+# 워커 시작 시 검색 엔진을 미리 준비할지 여부 (끄면 첫 연결 시 생성)
+RETRIEVAL_WARM_UP_ON_STARTUP = os.environ.get('RETRIEVAL_WARM_UP_ON_STARTUP', 'true').lower() == 'true'
+
+# 문서 임베딩과 FAISS 인덱스를 저장할 디렉터리
+RETRIEVAL_INDEX_DIR = os.environ.get('RETRIEVAL_INDEX_DIR', os.path.join(BASE_DIR, 'data', 'index'))
+
+# 문서/질의 임베딩 제공자: openai(API), hashing(네트워크 없는 CPU 해싱 임베딩), fake(테스트/벤치마크용 결정적 벡터)
+# EMBEDDING_DIMENSION 은 hashing/fake 에만 적용된다.
+EMBEDDING_PROVIDER = os.environ.get('EMBEDDING_PROVIDER', 'openai')
+EMBEDDING_DIMENSION = int(os.environ.get('EMBEDDING_DIMENSION', 1024))
+
+# 코퍼스 임베딩 파이프라인: 배치 크기, 동시 요청 수, 분당 토큰 한도(0 이면 무제한), 배치당 재시도 횟수
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 256))
+EMBEDDING_MAX_CONCURRENCY = int(os.environ.get('EMBEDDING_MAX_CONCURRENCY', 4))
+EMBEDDING_TOKENS_PER_MINUTE = int(os.environ.get('EMBEDDING_TOKENS_PER_MINUTE', 1000000))
+EMBEDDING_MAX_RETRIES = int(os.environ.get('EMBEDDING_MAX_RETRIES', 5))
+
+# FAISS 인덱스 종류(flat/ivf/hnsw)와 벡터 압축(none/fp16/pq). 코사인 유사도(정규화 + 내적)로 검색한다.
+# 바꾸기 전에 `python manage.py evaluate_index` 로 flat 대비 recall 과 지연 시간을 확인한다.
+RETRIEVAL_INDEX_TYPE = os.environ.get('RETRIEVAL_INDEX_TYPE', 'flat')
+RETRIEVAL_INDEX_COMPRESSION = os.environ.get('RETRIEVAL_INDEX_COMPRESSION', 'none')
+RETRIEVAL_IVF_NLIST = int(os.environ.get('RETRIEVAL_IVF_NLIST', 64))
+RETRIEVAL_IVF_NPROBE = int(os.environ.get('RETRIEVAL_IVF_NPROBE', 8))
+RETRIEVAL_HNSW_M = int(os.environ.get('RETRIEVAL_HNSW_M', 32))
+RETRIEVAL_HNSW_EF_SEARCH = int(os.environ.get('RETRIEVAL_HNSW_EF_SEARCH', 64))
+RETRIEVAL_PQ_M = int(os.environ.get('RETRIEVAL_PQ_M', 64))
+
+# 질의 임베딩 캐시 (프로세스 LRU + 선택적으로 Redis 공유 캐시)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get('QUERY_EMBEDDING_CACHE_SIZE', 2048))
+QUERY_EMBEDDING_CACHE_TTL = int(os.environ.get('QUERY_EMBEDDING_CACHE_TTL', 60 * 60 * 24))
+QUERY_EMBEDDING_CACHE_REDIS = os.environ.get('QUERY_EMBEDDING_CACHE_REDIS', 'false').lower() == 'true'
+
+# Mecab 형태소 분석 결과 캐시 크기 (nouns/morphs 각각)
+MECAB_CACHE_SIZE = int(os.environ.get('MECAB_CACHE_SIZE', 8192))
+
+# Mecab/FAISS 같은 CPU 작업 전용 스레드 수 (OpenAI 호출은 비동기로 처리)
+CPU_EXECUTOR_WORKERS = int(os.environ.get('CPU_EXECUTOR_WORKERS', os.cpu_count() or 4))
+
+# 토큰 스트리밍 프레임 묶음 설정 (STREAMING_FLUSH_INTERVAL_MS=0 이면 토큰마다 전송)
+STREAMING_FLUSH_INTERVAL_MS = int(os.environ.get('STREAMING_FLUSH_INTERVAL_MS', 50))
+STREAMING_FLUSH_BYTES = int(os.environ.get('STREAMING_FLUSH_BYTES', 512))
+STREAMING_SEND_QUEUE_SIZE = int(os.environ.get('STREAMING_SEND_QUEUE_SIZE', 64))
+
+# 최종 답변을 'answer_delta' 프레임으로 스트리밍할지 여부 (클라이언트가 지원해야 함)
+ANSWER_STREAMING = os.environ.get('ANSWER_STREAMING', 'false').lower() == 'true'
+
+# 대화 메모리: 최근 메시지 수/토큰 한도와 오래된 대화 요약 사용 여부
+CHAT_MEMORY_MAX_MESSAGES = int(os.environ.get('CHAT_MEMORY_MAX_MESSAGES', 20))
+CHAT_MEMORY_MAX_TOKENS = int(os.environ.get('CHAT_MEMORY_MAX_TOKENS', 2000))
+CHAT_MEMORY_SUMMARY = os.environ.get('CHAT_MEMORY_SUMMARY', 'true').lower() == 'true'
+# 요약 한 번에 반영할 최대 메시지 수/토큰 수 (남은 대화는 다음 턴에 이어서 요약)
+CHAT_MEMORY_SUMMARY_BATCH_MESSAGES = int(os.environ.get('CHAT_MEMORY_SUMMARY_BATCH_MESSAGES', 40))
+CHAT_MEMORY_SUMMARY_BATCH_TOKENS = int(os.environ.get('CHAT_MEMORY_SUMMARY_BATCH_TOKENS', 3000))
+
+# 메시지 저장 write-behind 설정 (MESSAGE_WRITE_MAX_RETRIES=0 이면 기록될 때까지 재시도, at-least-once)
+MESSAGE_WRITE_BEHIND = os.environ.get('MESSAGE_WRITE_BEHIND', 'true').lower() == 'true'
+MESSAGE_WRITE_BATCH_SIZE = int(os.environ.get('MESSAGE_WRITE_BATCH_SIZE', 50))
+MESSAGE_WRITE_FLUSH_INTERVAL_MS = int(os.environ.get('MESSAGE_WRITE_FLUSH_INTERVAL_MS', 500))
+MESSAGE_WRITE_MAX_RETRIES = int(os.environ.get('MESSAGE_WRITE_MAX_RETRIES', 0))
+
+# 의미 기반 답변 캐시 (같은 건물 + 질의 임베딩 코사인 유사도가 임계값 이상이면 재사용)
+ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+ANSWER_CACHE_THRESHOLD = float(os.environ.get('ANSWER_CACHE_THRESHOLD', 0.95))
+ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', 1000))
+ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', 60 * 60 * 6))
+
+# 라우터: 건물 매칭이 확실하고 계산이 없는 질문은 에이전트 없이 바로 검색 + 생성
+ROUTER_DIRECT_ENABLED = os.environ.get('ROUTER_DIRECT_ENABLED', 'true').lower() == 'true'
+ROUTER_MIN_FUZZY_SCORE = float(os.environ.get('ROUTER_MIN_FUZZY_SCORE', 90))
+
+# 동시에 들어온 같은 질문의 검색 + 생성을 한 번으로 묶기 (SINGLE_FLIGHT_REDIS=true 면 프로세스 간에도)
+SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+SINGLE_FLIGHT_REDIS = os.environ.get('SINGLE_FLIGHT_REDIS', 'false').lower() == 'true'
+SINGLE_FLIGHT_LOCK_TTL = float(os.environ.get('SINGLE_FLIGHT_LOCK_TTL', 30))
+
+# RAG 프롬프트 토큰 한도 (시스템 메시지 + 문서 + 질문 전체, 문서 하나당)
+PROMPT_MAX_TOKENS = int(os.environ.get('PROMPT_MAX_TOKENS', 3000))
+PROMPT_MAX_PASSAGE_TOKENS = int(os.environ.get('PROMPT_MAX_PASSAGE_TOKENS', 400))
+
+# 워커 공용 OpenAI HTTP 연결 풀 (전체/호스트별 연결 수, keep-alive 초, DNS 캐시 초)
+OPENAI_HTTP_LIMIT = int(os.environ.get('OPENAI_HTTP_LIMIT', 100))
+OPENAI_HTTP_LIMIT_PER_HOST = int(os.environ.get('OPENAI_HTTP_LIMIT_PER_HOST', 20))
+OPENAI_HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get('OPENAI_HTTP_KEEPALIVE_TIMEOUT', 30))
+OPENAI_HTTP_DNS_CACHE_TTL = int(os.environ.get('OPENAI_HTTP_DNS_CACHE_TTL', 300))
+
+# 하이브리드 검색: BM25(형태소) + 벡터 검색 결과를 reciprocal rank fusion 으로 결합
+RETRIEVAL_HYBRID = os.environ.get('RETRIEVAL_HYBRID', 'true').lower() == 'true'
+RETRIEVAL_RRF_K = int(os.environ.get('RETRIEVAL_RRF_K', 60))
+
+# 어휘 일치가 확실하면(1위 BM25 점수 >= MIN_SCORE, 2위의 MARGIN 배 이상) 질의 임베딩 없이 BM25 결과만 사용
+LEXICAL_FAST_PATH = os.environ.get('LEXICAL_FAST_PATH', 'true').lower() == 'true'
+LEXICAL_FAST_PATH_MIN_SCORE = float(os.environ.get('LEXICAL_FAST_PATH_MIN_SCORE', 10.0))
+LEXICAL_FAST_PATH_MARGIN = float(os.environ.get('LEXICAL_FAST_PATH_MARGIN', 1.5))
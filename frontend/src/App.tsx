@@ -28,10 +28,27 @@ export const App = () => {
         if (data.type === "debug") {
           const formattedToken = data.message.replace(/\n/g, '<br />');
           setDebugMessage(prevMessage => prevMessage + formattedToken);
+        } else if (data.type === "answer_delta") {
+          // Append streamed answer tokens to the bot message that is being written
+          setLoading(false);
+          setMessages(prevMessages => {
+            const last = prevMessages[prevMessages.length - 1];
+            if (last && last.streaming) {
+              return [...prevMessages.slice(0, -1), { ...last, content: last.content + data.message }];
+            }
+            return [...prevMessages, { sender: '쿠플봇', content: data.message, streaming: true }];
+          });
         } else {
           setLoading(false);
           const newMessage = { sender: '쿠플봇', content: data['message'] };
-          setMessages(prevMessages => [...prevMessages, newMessage]);
+          setMessages(prevMessages => {
+            // The final answer replaces the streamed draft, if there is one
+            const last = prevMessages[prevMessages.length - 1];
+            if (last && last.streaming) {
+              return [...prevMessages.slice(0, -1), newMessage];
+            }
+            return [...prevMessages, newMessage];
+          });
         }
       };
 
@@ -1,4 +1,5 @@
 export type Message = {
   sender: string;
   content: string;
+  streaming?: boolean;
 };